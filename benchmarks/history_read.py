@@ -0,0 +1,85 @@
+"""
+History-read latency vs. messages table size.
+
+Fills a throwaway user DB with N messages (a fixed number per user, so the user
+count grows with the table), then times user_db.get_messages() for random users,
+with and without the (email, id) index from the schema migrations. Prints one JSON object per table size.
+
+    python -m benchmarks.history_read --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src.storage import user_db
+
+
+def _fill(conn, n_rows, n_users, batch=50_000):
+    rows_done = 0
+    while rows_done < n_rows:
+        count = min(batch, n_rows - rows_done)
+        conn.executemany(
+            "INSERT INTO messages (email, role, content) VALUES (?, ?, ?)",
+            (
+                (f"user{(rows_done + i) % n_users}@example.com", "user" if i % 2 else "assistant", "x" * 80)
+                for i in range(count)
+            ),
+        )
+        conn.commit()
+        rows_done += count
+
+
+def _time_reads(n_users, reads, limit):
+    rng = random.Random(0)
+    samples = []
+    for _ in range(reads):
+        email = f"user{rng.randrange(n_users)}@example.com"
+        start = time.perf_counter()
+        user_db.get_messages(email, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+    }
+
+
+def run(sizes, rows_per_user, reads, limit):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            n_users = max(1, size // rows_per_user)
+            user_db.close_connections()
+            user_db.DB_PATH = os.path.join(tmp, f"bench_{size}.db")
+            user_db.init_db()
+            conn = user_db._connect()
+            _fill(conn, size, n_users)
+
+            indexed = _time_reads(n_users, reads, limit)
+            conn.execute("DROP INDEX idx_messages_email_id")
+            # Full scans are slow on big tables: sample fewer reads
+            unindexed = _time_reads(n_users, max(10, reads // 20), limit)
+
+            result = {"rows": size, "users": n_users, "limit": limit, "indexed": indexed, "unindexed": unindexed}
+            print(json.dumps(result))
+            results.append(result)
+    user_db.close_connections()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--rows-per-user", type=int, default=100)
+    parser.add_argument("--reads", type=int, default=2_000)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.rows_per_user, args.reads, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Retrieval latency and quality on synthetic corpora.
+
+Writes N sections as topic-headed .txt files (the doc_loader format), loads them
+with load_text_documents(), embeds them with a deterministic hashing embedder
+(no model download) and times each target over the same sampled queries:
+
+    store    InMemoryVectorStore.query (no topic filter)
+    topic    Retriever.retrieve (topic filter + cosine)
+    hybrid   HybridRetriever.retrieve (BM25 + dense)
+
+recall@k is measured against an exact float64 brute-force cosine top-k over the
+rows the target is allowed to return (topic-matched rows for "topic", all rows
+otherwise); for "hybrid" it is agreement with the pure dense ranking. Prints
+one JSON object per (size, target); --output also writes the whole run as one
+JSON document for comparing versions.
+
+    python -m benchmarks.retrieval --sizes 1000 10000 100000 --targets store topic
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from src.rag.doc_loader import load_text_documents
+from src.rag.retriever import HybridRetriever, Retriever
+from src.storage.sharded_vector_store import ShardedVectorStore
+from src.storage.vector_store import InMemoryVectorStore
+
+TOPICS = [
+    "stress", "anxiety", "sleep", "loneliness", "anger", "grief", "exam pressure",
+    "self esteem", "motivation", "relationships", "family conflict", "burnout",
+    "panic attacks", "social anxiety", "procrastination", "body image",
+]
+SECTIONS_PER_FILE = 200
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for the sentence-transformer: each token maps (by
+    crc32) to a fixed random vector and a text embeds as the sum of its tokens.
+    Texts sharing words end up close, so recall numbers are meaningful.
+    """
+
+    def __init__(self, dim: int = 384, n_buckets: int = 1 << 14, seed: int = 0):
+        self.table = np.random.default_rng(seed).standard_normal((n_buckets, dim)).astype("float32")
+
+    def _token_rows(self, text):
+        return [zlib.crc32(token.encode()) % len(self.table) for token in text.lower().split()]
+
+    def embed(self, texts, batch_size=None):
+        if isinstance(texts, str):
+            texts = [texts]
+        rows = [self._token_rows(text) for text in texts]
+        indptr = np.concatenate(([0], np.cumsum([len(r) for r in rows])))
+        indices = np.fromiter((row for r in rows for row in r), dtype="int64", count=int(indptr[-1]))
+        # Token-count matrix (texts x buckets) @ table, without materializing per-token vectors
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype="float32"), indices, indptr),
+            shape=(len(texts), len(self.table)),
+        )
+        return np.asarray(counts @ self.table, dtype="float32")
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+def write_corpus(doc_dir, n_sections, words_per_section=40, vocab_size=20_000, seed=0):
+    """n_sections topic-headed sections in the doc_loader format, SECTIONS_PER_FILE per file."""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    for file_idx, start in enumerate(range(0, n_sections, SECTIONS_PER_FILE)):
+        lines = []
+        for i in range(start, min(start + SECTIONS_PER_FILE, n_sections)):
+            topics = rng.sample(TOPICS, rng.randint(1, 2))
+            lines.append(f"Topic{i - start + 1}: {', '.join(topics)}")
+            lines.append(" ".join(rng.choices(vocab, k=words_per_section)))
+        with open(os.path.join(doc_dir, f"doc{file_idx:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+def build_store(docs, embedder, batch_size=4096, quantization=None, shards=1):
+    if shards > 1:
+        store = ShardedVectorStore(n_shards=shards, quantization=quantization)
+    else:
+        store = InMemoryVectorStore(quantization=quantization)
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        texts = [doc["text"] for doc in batch]
+        store.add_many([doc["id"] for doc in batch], texts, embedder.embed(texts), [doc["metadata"] for doc in batch])
+    return store
+
+
+def make_queries(docs, n_queries, seed=1):
+    """A topic of a random section plus a few of its words (what a user might type)."""
+    rng = random.Random(seed)
+    queries = []
+    for doc in rng.sample(docs, min(n_queries, len(docs))):
+        words = rng.sample(doc["text"].split(), 4)
+        queries.append(f"{rng.choice(doc['metadata']['topics'])} {' '.join(words)}")
+    return queries
+
+
+def brute_force_ids(store, matrix, q, k, mask=None):
+    """Exact top-k ids in float64 (the reference for recall)."""
+    q = q.astype("float64")
+    sims = matrix @ (q / np.linalg.norm(q))
+    if mask is not None:
+        sims = np.where(mask, sims, -np.inf)
+        k = min(k, int(mask.sum()))
+    top = np.argsort(-sims, kind="stable")[:k]
+    return {store.ids[i] for i in top}
+
+
+def run_target(target, store, embedder, queries, top_k, bm25_dir):
+    if target == "store":
+        search = lambda query, q_emb: store.query(q_emb, top_k=top_k)
+    elif target == "topic":
+        retriever = Retriever(embedder, store)
+        search = lambda query, q_emb: retriever.retrieve(query, top_k=top_k, query_embedding=q_emb)
+    elif target == "hybrid":
+        retriever = HybridRetriever(embedder, store, index_path=bm25_dir)
+        search = lambda query, q_emb: retriever.retrieve(query, top_k=top_k, query_embedding=q_emb)
+    else:
+        raise ValueError(f"Unknown target: {target!r}")
+
+    # Embedding is not what is being measured: do it up front
+    q_embs = [embedder.embed_query(query) for query in queries]
+    search(queries[0], q_embs[0])  # warm-up (lazy quantized copy, BM25 load)
+
+    samples, results = [], []
+    wall_start = time.perf_counter()
+    for query, q_emb in zip(queries, q_embs):
+        start = time.perf_counter()
+        results.append(search(query, q_emb))
+        samples.append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+
+    # Reference matrix in float64, normalized once
+    matrix = np.asarray(store.embeddings, dtype="float64")
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    recalls = []
+    for query, q_emb, found in zip(queries, q_embs, results):
+        mask = store.topic_mask(query) if target == "topic" else None
+        expected = brute_force_ids(store, matrix, q_emb, top_k, mask)
+        if expected:
+            recalls.append(len(expected & {doc["id"] for doc in found}) / len(expected))
+
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 4),
+        "qps": round(len(samples) / wall, 1),
+        f"recall@{top_k}": round(statistics.mean(recalls), 4) if recalls else None,
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run(sizes, targets, n_queries=500, top_k=3, dim=384, quantization=None, shards=1):
+    embedder = HashingEmbedder(dim=dim)
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            doc_dir = os.path.join(tmp, "docs")
+            os.makedirs(doc_dir)
+            write_corpus(doc_dir, size)
+            docs = load_text_documents(doc_dir)
+
+            start = time.perf_counter()
+            store = build_store(docs, embedder, quantization=quantization, shards=shards)
+            build_s = time.perf_counter() - start
+            queries = make_queries(docs, n_queries)
+
+            for target in targets:
+                result = {
+                    "sections": len(docs),
+                    "target": target,
+                    "dim": dim,
+                    "quantization": quantization or "none",
+                    "shards": shards,
+                    "top_k": top_k,
+                    "queries": len(queries),
+                    "build_s": round(build_s, 3),
+                    **run_target(target, store, embedder, queries, top_k, os.path.join(tmp, "bm25")),
+                    "store_mb": round(len(store.ids) * dim * 4 / 2**20, 1),
+                    "peak_rss_mb": _peak_rss_mb(),
+                }
+                print(json.dumps(result))
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--targets", nargs="+", choices=["store", "topic", "hybrid"], default=["store", "topic", "hybrid"])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--quantization", choices=["float16", "int8"], default=None)
+    parser.add_argument("--shards", type=int, default=1, help="use a ShardedVectorStore (topic partition) with N shards")
+    parser.add_argument("--output", help="also write all results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.targets, args.queries, args.top_k, args.dim, args.quantization, args.shards)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,38 @@
+import asyncio
 import email
 import os
 import datetime
 import hashlib
 
-from groq import Groq
-
 from src.rag.embeddings import Embedder
-from src.storage.vector_store import InMemoryVectorStore
+from src.storage.sharded_vector_store import create_vector_store
 from src.rag.indexer import Indexer
-from src.rag.retriever import Retriever
+from src.rag.retriever import create_retriever, expand_neighbours
 from src.storage.chat_history import ChatHistory
 from src.llm.prompts import build_messages
 from src.llm.instruction_templates import DEFAULT_INSTRUCTION
 from src.rag.doc_loader import load_text_documents
-from src.llm.client import LLMClient
+from src.llm.client import get_llm_client
+from src.llm.response_cache import SemanticResponseCache
 import src.utils.config as config
+from src.utils.fs import file_lock
 
 # GLOBAL placeholders (not initialized at import!)
 EMBEDDER = None
 VECTOR_STORE = None
 RAG = None
 LLM = None
+RESPONSE_CACHE = None
 chat_history = None
 
 
+def _load_store(store):
+    if store.load():
+        print(f"✅ Loaded vector store with {len(store.ids)} documents.")
+    else:
+        print("📚 No vector store found — building index...")
+
+
 def init_rag():
     """
     Initialize RAG components.
@@ -32,42 +41,75 @@ def init_rag():
     print("🔄 Initializing RAG pipeline...")
 
     embedder = Embedder()
-    store = InMemoryVectorStore()
-    vs_path = config.VECTOR_STORE_PATH
-
-    if os.path.exists(vs_path):
-        print(f"🔍 Found vector store at: {vs_path}")
-        store.load(vs_path)
-        print(f"✅ Loaded vector store with {len(store.ids)} documents.")
-    else:
-        print("📚 No vector store found — building index...")
-        docs = load_text_documents(config.DOCS_DIR)
-        indexer = Indexer(embedder, store)
-        indexer.index_documents(docs)
-        store.save(vs_path)
-
-    retriever = Retriever(embedder, store)
+    store = create_vector_store()
+
+    # One worker syncs the shared store with the docs; workers starting meanwhile
+    # wait for it and then only load what it saved
+    lock_path = f"{config.VECTOR_STORE_PATH}.sync.lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with file_lock(lock_path, blocking=False) as leader:
+        if leader:
+            _load_store(store)
+            # Re-embed only new/changed sections (deployments without docs keep the shipped store)
+            docs = load_text_documents(config.DOCS_DIR) if os.path.isdir(config.DOCS_DIR) else []
+            if docs:
+                stats = Indexer(embedder, store).sync(docs)
+                print(f"✅ Synced vector store: {stats}")
+    if not leader:
+        print("⏳ Another worker is syncing the vector store — waiting to load it")
+        with file_lock(lock_path):
+            _load_store(store)
+
+    retriever = create_retriever(embedder, store)
     return embedder, store, retriever
 
 
 def initialize_all():
     """Called by FastAPI startup event."""
-    global EMBEDDER, VECTOR_STORE, RAG, LLM, chat_history
+    global EMBEDDER, VECTOR_STORE, RAG, LLM, RESPONSE_CACHE, chat_history
 
     EMBEDDER, VECTOR_STORE, RAG = init_rag()
 
+    # Opt-in: reuse answers for near-identical opening questions
+    RESPONSE_CACHE = SemanticResponseCache() if config.RESPONSE_CACHE_ENABLED else None
+
     # ✅ NEW: Initialize Groq client (IMPORTANT)
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     if not GROQ_API_KEY:
         raise RuntimeError("🚨 GROQ_API_KEY is missing in environment variables!")
 
-    LLM = Groq(api_key=GROQ_API_KEY)
+    # Shared client: one pooled keep-alive connection set for all chats
+    LLM = get_llm_client()
     
     chat_history = ChatHistory(email)
 
     print("✅ All components initialized!")
 
 
+def shutdown_all():
+    """Called by FastAPI shutdown event."""
+    if VECTOR_STORE is not None:
+        VECTOR_STORE.close()  # removes a quantized store's spill file
+
+
+def _use_response_cache(chat_history):
+    # Only for a conversation's first message (the query is the only turn): any
+    # earlier turn could change the answer, for lookups and stores alike
+    return RESPONSE_CACHE is not None and len(chat_history.last_n(2)) == 1
+
+
+def _retrieve(user_query: str, use_cache: bool):
+    """
+    Retrieval, plus the query embedding when the response cache needs it. The
+    embedding is None when retrieval cannot match anything (e.g. no topic hit):
+    nothing is embedded, and the cache is skipped.
+    """
+    q_emb = EMBEDDER.embed_query(user_query) if use_cache and RAG.may_match(user_query) else None
+    retrieved = RAG.retrieve(user_query, top_k=3, query_embedding=q_emb)
+    # Chunks of long sections come with their neighbours for context
+    return q_emb, expand_neighbours(retrieved, VECTOR_STORE)
+
+
 def run_rag_pipeline(user_query: str, chat_history):
     """Used by android_server.py"""
     global EMBEDDER, VECTOR_STORE, RAG, LLM
@@ -81,7 +123,14 @@ def run_rag_pipeline(user_query: str, chat_history):
 
     chat_history.add_user(user_query)
 
-    retrieved = RAG.retrieve(user_query, top_k=3)
+    use_cache = _use_response_cache(chat_history)
+    q_emb, retrieved = _retrieve(user_query, use_cache)
+    doc_ids = [d["id"] for d in retrieved]
+
+    cached = RESPONSE_CACHE.lookup(q_emb, doc_ids) if q_emb is not None else None
+    if cached:
+        chat_history.add_assistant(cached)
+        return cached
 
     messages = build_messages(
         user_query,
@@ -89,13 +138,107 @@ def run_rag_pipeline(user_query: str, chat_history):
         chat_history.last_n(6),
         instruction=DEFAULT_INSTRUCTION,
     )
-    LLm= LLMClient()
-    answer = LLm.generate_response(messages)
+    answer = LLM.generate_response(messages)
 
     if not answer:
         return "LLM failed to generate a reply"
 
+    if q_emb is not None:
+        RESPONSE_CACHE.store(q_emb, doc_ids, answer)
 
     chat_history.add_assistant(answer)
 
     return answer
+
+
+async def arun_rag_pipeline(user_query: str, chat_history):
+    """
+    Async version used by android_server.py's /chat: storage and the Groq call are
+    awaited, only CPU-bound retrieval (query embedding + scoring) runs in a thread.
+    """
+    global EMBEDDER, VECTOR_STORE, RAG, LLM
+
+    if EMBEDDER is None:
+        return "System not initialized yet. Please wait 2 seconds and retry."
+
+    user_query = user_query.strip()
+    if not user_query:
+        return "Empty query"
+
+    await chat_history.aadd_user(user_query)
+
+    use_cache = _use_response_cache(chat_history)
+    q_emb, retrieved = await asyncio.to_thread(_retrieve, user_query, use_cache)
+    doc_ids = [d["id"] for d in retrieved]
+
+    cached = RESPONSE_CACHE.lookup(q_emb, doc_ids) if q_emb is not None else None
+    if cached:
+        await chat_history.aadd_assistant(cached)
+        return cached
+
+    messages = build_messages(
+        user_query,
+        retrieved,
+        chat_history.last_n(6),
+        instruction=DEFAULT_INSTRUCTION,
+    )
+    answer = await LLM.agenerate_response(messages)
+
+    if not answer:
+        return "LLM failed to generate a reply"
+
+    if q_emb is not None:
+        RESPONSE_CACHE.store(q_emb, doc_ids, answer)
+
+    await chat_history.aadd_assistant(answer)
+
+    return answer
+
+
+async def astream_rag_pipeline(user_query: str, chat_history):
+    """
+    Streaming version of arun_rag_pipeline: yields reply tokens as they arrive and
+    records the full answer in chat history once the stream completes. Failures
+    raise (RuntimeError / ValueError) instead of being yielded as reply text.
+    """
+    global EMBEDDER, VECTOR_STORE, RAG, LLM
+
+    if EMBEDDER is None:
+        raise RuntimeError("System not initialized yet. Please wait 2 seconds and retry.")
+
+    user_query = user_query.strip()
+    if not user_query:
+        raise ValueError("Empty query")
+
+    await chat_history.aadd_user(user_query)
+
+    use_cache = _use_response_cache(chat_history)
+    q_emb, retrieved = await asyncio.to_thread(_retrieve, user_query, use_cache)
+    doc_ids = [d["id"] for d in retrieved]
+
+    cached = RESPONSE_CACHE.lookup(q_emb, doc_ids) if q_emb is not None else None
+    if cached:
+        yield cached
+        await chat_history.aadd_assistant(cached)
+        return
+
+    messages = build_messages(
+        user_query,
+        retrieved,
+        chat_history.last_n(6),
+        instruction=DEFAULT_INSTRUCTION,
+    )
+
+    parts = []
+    async for token in LLM.astream_response(messages):
+        parts.append(token)
+        yield token
+
+    answer = "".join(parts)
+    if not answer:
+        raise RuntimeError("LLM failed to generate a reply")
+
+    if q_emb is not None:
+        RESPONSE_CACHE.store(q_emb, doc_ids, answer)
+
+    await chat_history.aadd_assistant(answer)
@@ -1,20 +1,22 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import json
 import time
 import logging
-from flask import request
-import bcrypt
-from fastapi import HTTPException
-from src.storage.chat_history import ChatHistory
+from src.storage.history_cache import ChatHistoryCache
+from src.storage.write_behind import WriteBehindWriter
+from src.storage.io_executor import run_io
+from src.utils.security import ahash_password, averify_password, create_session_token, verify_session_token
+import src.utils.config as config
 
 
 # User DB imports
-from src.storage.user_db import init_db, create_user, get_user, increment_usage
+from src.storage.user_db import init_db, create_user, get_user, close_connections
 
 # RAG pipeline imports
-from src.android_main import initialize_all, run_rag_pipeline
+from src.android_main import initialize_all, shutdown_all, arun_rag_pipeline, astream_rag_pipeline
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +24,12 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Mental Health RAG API")
 
+# Loaded per-user chat histories, kept hot for active conversations
+HISTORY_CACHE = ChatHistoryCache()
+
+# Usage increments are batched off the request path (flushed on shutdown)
+WRITE_BEHIND = WriteBehindWriter()
+
 # Initialize DB immediately
 init_db()
 
@@ -32,6 +40,12 @@ def startup_event():
     initialize_all()
     logger.info("✅ RAG system ready!")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    WRITE_BEHIND.close()
+    shutdown_all()
+    close_connections()
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +58,9 @@ app.add_middleware(
 class ChatQuery(BaseModel):
     email: str
     message: str
+    # Session token from /auth/login: checked when sent; required only with
+    # REQUIRE_SESSION_TOKEN (older clients send just the email)
+    token: str | None = None
 
 class RegisterRequest(BaseModel):
     email: str
@@ -67,15 +84,16 @@ async def register_user(request: RegisterRequest):
         password = request.password
 
         # Check if user exists
-        user = get_user(email)
+        user = await run_io(get_user, email)
         if user:
             return {
                 "success": "existing",
                 "error": None
             }
 
-        # Create new user
-        create_user(email, age, sex, password)
+        # Create new user (bcrypt runs on the password pool, not the event loop)
+        hashed = await ahash_password(password)
+        await run_io(create_user, email, age, sex, password_hash=hashed)
 
         return {
             "success": "new",
@@ -91,29 +109,44 @@ async def register_user(request: RegisterRequest):
 # --------------------------------------------------------
 # ✅ CHAT ENDPOINT WITH USAGE LIMIT
 # --------------------------------------------------------
-@app.post("/chat")
-async def chat(query: ChatQuery):
-    email = query.email
-    message = query.message
+FREE_LIMIT = config.FREE_CHAT_LIMIT
+
+
+async def _check_chat_allowed(email: str, token: str = None):
+    """
+    Returns (usage, None) if the user may chat, else (usage, error response).
+
+    The session token is opt-in: a token that is sent must be valid for `email`,
+    but a missing one is only rejected when REQUIRE_SESSION_TOKEN is set.
+
+    The original handler read usage from row[3] (the password hash), whose int()
+    always failed to 0, so FREE_LIMIT was never enforced. That stays the default:
+    only with ENFORCE_FREE_CHAT_LIMIT is the real usage_count read and checked.
+    """
+    if token is None:
+        token_ok = not config.REQUIRE_SESSION_TOKEN
+    else:
+        token_ok = verify_session_token(token) == email
+    if not token_ok:
+        return 0, {
+            "allowed": False,
+            "error": "Invalid or expired session. Please log in again.",
+            "reply": None
+        }
 
-    user = get_user(email)
-    if not user:
-        return {
+    # Stored usage + not-yet-flushed increments (read-your-writes)
+    usage = await run_io(WRITE_BEHIND.get_usage, email)
+    if usage is None:
+        return 0, {
             "allowed": False,
             "error": "User not registered",
             "reply": None
         }
+    if not config.ENFORCE_FREE_CHAT_LIMIT:
+        return 0, None  # same as the original handler's fallback
 
-    # Extract usage_count from database
-    usage = user[3]
-    try:
-        usage = int(usage)
-    except:
-        usage = 0
-
-    FREE_LIMIT = 50
     if usage >= FREE_LIMIT:
-        return {
+        return usage, {
             "allowed": False,
             "error": "Free limit reached. Please subscribe to continue.",
             "used": usage,
@@ -121,13 +154,25 @@ async def chat(query: ChatQuery):
             "reply": None
         }
 
-    # 👉 NEW: per-user chat history
-    chat_history = ChatHistory(email)
+    return usage, None
+
+
+@app.post("/chat")
+async def chat(query: ChatQuery):
+    email = query.email
+    message = query.message
+
+    usage, error = await _check_chat_allowed(email, query.token)
+    if error:
+        return error
+
+    # 👉 NEW: per-user chat history (cached across requests)
+    chat_history = await HISTORY_CACHE.aget(email)
 
     start = time.time()
     try:
-        # 👉 Pass ChatHistory to the RAG pipeline
-        reply = await run_in_threadpool(run_rag_pipeline, message, chat_history)
+        # 👉 Pass ChatHistory to the async RAG pipeline (no thread held while waiting on Groq)
+        reply = await arun_rag_pipeline(message, chat_history)
     except Exception as e:
         return {
             "allowed": False,
@@ -135,7 +180,7 @@ async def chat(query: ChatQuery):
             "reply": None
         }
 
-    increment_usage(email)
+    WRITE_BEHIND.increment_usage(email)
 
     return {
         "allowed": True,
@@ -148,6 +193,54 @@ async def chat(query: ChatQuery):
 
 
 
+# --------------------------------------------------------
+# ✅ STREAMING CHAT ENDPOINT (server-sent events)
+# --------------------------------------------------------
+def _sse(data: dict, event: str = None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(query: ChatQuery):
+    """
+    Same as /chat, but the reply is streamed as SSE: one `data: {"token": ...}`
+    event per chunk, then `event: done` (usage info) or `event: error`. A
+    failed reply is not counted against the user's usage.
+    """
+    email = query.email
+    message = query.message
+
+    usage, error = await _check_chat_allowed(email, query.token)
+    if error:
+        return error
+
+    chat_history = await HISTORY_CACHE.aget(email)
+
+    async def events():
+        start = time.time()
+        try:
+            async for token in astream_rag_pipeline(message, chat_history):
+                yield _sse({"token": token})
+        except Exception as e:
+            yield _sse({"error": f"Failed to generate reply: {str(e)}"}, event="error")
+            return
+
+        WRITE_BEHIND.increment_usage(email)
+        yield _sse({
+            "allowed": True,
+            "usage_now": usage + 1,
+            "limit": FREE_LIMIT,
+            "processing_time": round(time.time() - start, 2),
+        }, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # --------------------------------------------------------
 # HEALTH CHECK
 # --------------------------------------------------------
@@ -174,13 +267,13 @@ async def login(req: LoginRequest):
     email = req.email.strip().lower()
     password = req.password
 
-    user = get_user(email)
+    user = await run_io(get_user, email)
     if not user:
         return {"error": "User does not exist"}
 
     stored_hash = user[3]
 
-    if not bcrypt.checkpw(password.encode(), stored_hash.encode()):
+    if not await averify_password(password, stored_hash):
         return {"error": "Incorrect password"}
 
     return {
@@ -188,5 +281,8 @@ async def login(req: LoginRequest):
         "email": user[0],
         "age": user[1],
         "sex": user[2],
-        "usage_count": user[4]
+        "usage_count": user[4],
+        # Short-lived signed token: send it with /chat instead of re-sending the password
+        "token": create_session_token(user[0]),
+        "expires_in": config.SESSION_TTL_SECONDS
     }
@@ -7,7 +7,8 @@ from src.llm.client import LLMClient
 from src.storage.chat_history import ChatHistory
 from src.rag.embeddings import Embedder
 from src.storage.vector_store import InMemoryVectorStore as VectorStore
-from src.storage.user_db import create_user, get_user, init_db, save_message
+from src.storage.user_db import create_user, get_user, init_db, close_connections
+from src.storage.write_behind import WriteBehindWriter
 
 import bcrypt
 print("🔥 FASTAPI SERVER FILE LOADED!")
@@ -25,6 +26,14 @@ retriever = Retriever(embedder, vector_store)
 
 llm_client = LLMClient()
 chat_history = ChatHistory()
+# Message inserts are batched into one transaction off the request path
+write_behind = WriteBehindWriter()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    write_behind.close()
+    close_connections()
 
 
 # ----------------------------------------------------------------------
@@ -68,9 +77,9 @@ async def chat(req: ChatRequest):
         chat_history.add_user(user_input)
         chat_history.add_assistant(reply)
 
-        # Save to DB
-        save_message(email, "user", user_input)
-        save_message(email, "assistant", reply)
+        # Save to DB (write-behind)
+        write_behind.save_message(email, "user", user_input)
+        write_behind.save_message(email, "assistant", reply)
 
         # Clean docs
         documents_clean = [
@@ -4,42 +4,139 @@ import os
 import groq
 print("🚩 runtime debug: groq package version =", getattr(groq, "__version__", "unknown"))
 
-from groq import Groq
+import threading
+
+import httpx
+from groq import AsyncGroq, Groq
 import src.utils.config as config
 
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout():
+    return httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT)
+
+
 class LLMClient:
-    def __init__(self, model_name=None):
+    def __init__(
+        self,
+        model_name=None,
+        http_client: httpx.Client = None,
+        transport: httpx.BaseTransport = None,
+        async_transport: httpx.AsyncBaseTransport = None,
+    ):
+        """
+        `transport` / `async_transport` swap the network layer (e.g. httpx.MockTransport
+        in tests); `http_client` lets callers share an existing pooled client.
+        """
         self.api_key = config.GROQ_API_KEY
         if not self.api_key:
             raise ValueError("GROQ_API_KEY is missing in .env file")
 
-        # No patched http_client, use plain Groq
-        self.client = Groq(api_key=self.api_key)
+        # One keep-alive connection pool per client, reused across requests/threads
+        self.http_client = http_client or httpx.Client(
+            limits=_http_limits(),
+            timeout=_http_timeout(),
+            transport=transport,
+        )
+        self.client = Groq(
+            api_key=self.api_key,
+            http_client=self.http_client,
+            max_retries=config.LLM_MAX_RETRIES,
+        )
+
+        # Async twin for the event-loop pipeline: awaiting Groq holds no thread
+        self.async_http_client = httpx.AsyncClient(
+            limits=_http_limits(),
+            timeout=_http_timeout(),
+            transport=async_transport,
+        )
+        self.async_client = AsyncGroq(
+            api_key=self.api_key,
+            http_client=self.async_http_client,
+            max_retries=config.LLM_MAX_RETRIES,
+        )
         self.model = model_name or config.GROQ_MODEL
 
+    def _completion_kwargs(self, messages):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 500,
+        }
+
+    @staticmethod
+    def _extract_content(response):
+        # If Groq returned 400 or invalid content
+        # Invalid or empty choices
+        if not response or not hasattr(response, "choices") or len(response.choices) == 0:
+            try:
+                print("❌ RAW GROQ ERROR:", response.error)
+            except:
+                print("❌ RAW GROQ RESPONSE:", response)
+            return None
+
+        content = response.choices[0].message.content
+        return content or ""
+
     def generate_response(self, messages):
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-
-            # If Groq returned 400 or invalid content
-            # Invalid or empty choices
-            if not response or not hasattr(response, "choices") or len(response.choices) == 0:
-                try:
-                    print("❌ RAW GROQ ERROR:", response.error)
-                except:
-                    print("❌ RAW GROQ RESPONSE:", response)
-                return None
-
-
-            content = response.choices[0].message.content
-            return content or ""
+            response = self.client.chat.completions.create(**self._completion_kwargs(messages))
+            return self._extract_content(response)
 
         except Exception as e:
             print(f"❌ Error in LLM.generate: {e}")
             return None
-        
+
+    async def agenerate_response(self, messages):
+        """Async version of generate_response (same return contract)."""
+        try:
+            response = await self.async_client.chat.completions.create(**self._completion_kwargs(messages))
+            return self._extract_content(response)
+
+        except Exception as e:
+            print(f"❌ Error in LLM.agenerate: {e}")
+            return None
+
+    async def astream_response(self, messages):
+        """
+        Async generator of content deltas as Groq produces them (stream=True).
+        Errors propagate to the caller, which has usually already sent partial output.
+        """
+        stream = await self.async_client.chat.completions.create(
+            **self._completion_kwargs(messages),
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def close(self):
+        self.http_client.close()
+
+    async def aclose(self):
+        await self.async_http_client.aclose()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Process-wide LLMClient (thread-safe, created on first use)."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = LLMClient()
+    return _shared_client
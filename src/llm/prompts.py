@@ -1,30 +1,17 @@
 from .instruction_templates import DEFAULT_INSTRUCTION
+import src.utils.config as config
+from src.utils.tokens import count_tokens, truncate_to_tokens
 
-def build_messages(user_query: str, retrieved_docs: list, chat_history: list, instruction: str = None):
-    """
-    Build a clean, safe prompt with NO document IDs, NO chain-of-thought, 
-    and NO mention of retrieval or sections.
-    """
-    instruction = instruction or DEFAULT_INSTRUCTION
+# Role markers etc. added by the chat template around each message
+_MESSAGE_OVERHEAD = 4
 
-    system_msg = {
-        "role": "system",
-        "content": instruction
-    }
-
-    # Summaries only — silent RAG
-    combined_knowledge = ""
-    for d in retrieved_docs:
-        combined_knowledge += f"{d['text']}\n\n"
-
-    # Build clean user message
-    user_content = f"""
+_USER_TEMPLATE = """
 Here is some helpful background information (use it silently, without mentioning documents):
 
-{combined_knowledge.strip()}
+{knowledge}
 
 User question:
-{user_query}
+{query}
 
 Provide a natural, empathetic answer following the guidelines. 
 Do NOT mention:
@@ -36,10 +23,73 @@ Do NOT mention:
 - reasoning steps
 - chain-of-thought
     """
+_TEMPLATE_TOKENS = count_tokens(_USER_TEMPLATE.format(knowledge="", query=""))
+
+
+def _section_tokens(doc):
+    """Token count stored with the section at index time (counted here if it is missing)."""
+    n_tokens = (doc.get("metadata") or {}).get("n_tokens")
+    return count_tokens(doc["text"]) if n_tokens is None else n_tokens
+
+
+def _pack_history(chat_history, budget):
+    """Newest messages that fit in `budget` (oldest dropped first), in order, and their token cost."""
+    kept, used = [], 0
+    for msg in reversed(chat_history):
+        cost = count_tokens(msg["content"]) + _MESSAGE_OVERHEAD
+        if used + cost > budget:
+            break
+        kept.append(msg)
+        used += cost
+    kept.reverse()
+    return kept, used
+
+
+def _pack_context(retrieved_docs, budget):
+    """
+    Section texts that fit in `budget`, best-ranked first (retrievers return them
+    in that order): the first section that does not fit is truncated if enough
+    room is left, and the lower-ranked rest are dropped.
+    """
+    texts = []
+    for d in retrieved_docs:
+        cost = _section_tokens(d) + 1  # blank line between sections
+        if cost <= budget:
+            texts.append(d["text"])
+            budget -= cost
+            continue
+        if budget >= config.PROMPT_MIN_SECTION_TOKENS:
+            texts.append(truncate_to_tokens(d["text"], budget))
+        break
+    return texts
+
+
+def build_messages(user_query: str, retrieved_docs: list, chat_history: list, instruction: str = None, token_budget: int = None):
+    """
+    Build a clean, safe prompt with NO document IDs, NO chain-of-thought, 
+    and NO mention of retrieval or sections.
+
+    The prompt fits `token_budget` (PROMPT_TOKEN_BUDGET) estimated tokens: the
+    instruction and question always go in, chat history gets up to
+    PROMPT_HISTORY_TOKENS, and retrieved context gets what is left.
+    """
+    instruction = instruction or DEFAULT_INSTRUCTION
+    budget = token_budget or config.PROMPT_TOKEN_BUDGET
+
+    system_msg = {
+        "role": "system",
+        "content": instruction
+    }
+
+    budget -= count_tokens(instruction) + count_tokens(user_query) + _TEMPLATE_TOKENS + 2 * _MESSAGE_OVERHEAD
 
     # Add chat history (assistant + user messages)
-    history_messages = []
-    for msg in chat_history:
-        history_messages.append(msg)
+    history_messages, history_tokens = _pack_history(chat_history, min(budget, config.PROMPT_HISTORY_TOKENS))
+
+    # Summaries only — silent RAG
+    combined_knowledge = "\n\n".join(_pack_context(retrieved_docs, budget - history_tokens))
+
+    # Build clean user message
+    user_content = _USER_TEMPLATE.format(knowledge=combined_knowledge.strip(), query=user_query)
 
     return [system_msg] + history_messages + [{"role": "user", "content": user_content}]
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import src.utils.config as config
+
+
+class _Entry:
+    def __init__(self, embedding, doc_key, answer):
+        self.embedding = embedding
+        self.doc_key = doc_key
+        self.answer = answer
+        self.created = time.time()
+        self.hits = 0
+
+
+class SemanticResponseCache:
+    """
+    Caches LLM answers for fresh conversations. A new query reuses a cached answer
+    when it retrieved the same doc ids and its embedding's cosine similarity to the
+    cached query is >= `threshold`. Entries expire after `ttl` seconds; the least
+    recently used entry is evicted beyond `max_entries`.
+    """
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = threshold or config.RESPONSE_CACHE_THRESHOLD
+        self.ttl = ttl or config.RESPONSE_CACHE_TTL
+        self.max_entries = max_entries or config.RESPONSE_CACHE_SIZE
+        self._entries = OrderedDict()  # entry id -> _Entry (LRU order)
+        self._by_docs = {}  # doc id tuple -> [entry id]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype="float32").ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(self, query_embedding, doc_ids):
+        q = self._normalize(query_embedding)
+        doc_key = tuple(doc_ids)
+        now = time.time()
+
+        with self._lock:
+            for i in [i for i in self._by_docs.get(doc_key, []) if now - self._entries[i].created > self.ttl]:
+                self._remove(i)
+            entry_ids = list(self._by_docs.get(doc_key, []))
+
+            if entry_ids:
+                sims = np.stack([self._entries[i].embedding for i in entry_ids]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry = self._entries[entry_ids[best]]
+                    entry.hits += 1
+                    self._entries.move_to_end(entry_ids[best])
+                    self.hits += 1
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, doc_ids, answer):
+        entry = _Entry(self._normalize(query_embedding), tuple(doc_ids), answer)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_docs.setdefault(entry.doc_key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_docs[entry.doc_key]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_docs[entry.doc_key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": [
+                    {"docs": list(e.doc_key), "hits": e.hits, "age_s": round(time.time() - e.created, 1)}
+                    for e in self._entries.values()
+                ],
+            }
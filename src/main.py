@@ -2,9 +2,9 @@ import os
 import datetime
 
 from src.rag.embeddings import Embedder
-from src.storage.vector_store import InMemoryVectorStore
+from src.storage.sharded_vector_store import create_vector_store
 from src.rag.indexer import Indexer
-from src.rag.retriever import Retriever
+from src.rag.retriever import create_retriever, expand_neighbours
 from src.storage.chat_history import ChatHistory
 from src.llm.client import LLMClient
 from src.llm.prompts import build_messages
@@ -30,23 +30,19 @@ def save_chat_to_file(user_input, assistant_output):
 def main():
     # Initialize components
     embedder = Embedder()
-    vector_store = InMemoryVectorStore()
+    vector_store = create_vector_store()
     vector_store.load()
 
     indexer = Indexer(embedder, vector_store)
 
-    # Always re-index documents to pick up new sections/changes
+    # Sync documents on every start: only new/changed sections are re-embedded
     # print("📚 Loading and indexing documents...")
     docs = load_text_documents(os.path.join(config.DATA_DIR, "docs"))
-    # Clear existing data and re-index
-    vector_store.ids = []
-    vector_store.texts = []
-    vector_store.metadatas = []
-    vector_store.embeddings = None
-    indexer.index_documents(docs)
-    print(f"✅ Indexed {len(docs)} document sections")
-
-    retriever = Retriever(embedder, vector_store)
+    stats = indexer.sync(docs)
+    print(f"✅ Indexed {len(docs)} document sections "
+          f"({stats['added']} added, {stats['updated']} updated, {stats['removed']} removed)")
+
+    retriever = create_retriever(embedder, vector_store)
     chat_history = ChatHistory()
     llm = LLMClient()
 
@@ -67,7 +63,7 @@ def main():
         chat_history.add_user(user_q)
 
         # Run retrieval
-        retrieved = retriever.retrieve(user_q, top_k=3)
+        retrieved = expand_neighbours(retriever.retrieve(user_q, top_k=3), vector_store)
         
         # Display retrieved documents and sections
         if len(retrieved) > 0:
@@ -0,0 +1,149 @@
+"""
+Sparse BM25 index over the vector store's sections, saved next to the store:
+
+    header.json     k1, b, doc count, store fingerprint
+    vocab.json      terms in column order
+    weights.npz     doc x term CSC matrix of precomputed BM25 weights
+
+The fingerprint (ids + content hashes) ties the index to one version of the
+store; a stale or missing index is rebuilt from the store's texts.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from src.utils.fs import atomic_dir
+from src.utils.ranking import top_rows
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def section_text(text, metadata):
+    """What BM25 sees for a section: its topics (soft topic match) + its text."""
+    topics = " ".join((metadata or {}).get("topics") or [])
+    return f"{topics}\n{text}"
+
+
+def store_fingerprint(vector_store):
+    digest = hashlib.sha256()
+    for row, doc_id in enumerate(vector_store.ids):
+        # Sections added without a content hash fall back to their text
+        content = vector_store.hashes[row] or vector_store.texts[row]
+        digest.update(f"{doc_id}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BM25Index:
+    """
+    Okapi BM25. Each (doc, term) weight
+        idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_doc_len))
+    is precomputed at build time, so scoring a query is one sparse column
+    slice times the query's term counts.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.weights = sparse.csc_matrix((0, 0), dtype="float32")
+        self.fingerprint = None
+
+    @property
+    def n_docs(self):
+        return self.weights.shape[0]
+
+    def build(self, texts, fingerprint=None):
+        vocab = {}
+        rows, cols, counts = [], [], []
+        doc_lens = np.zeros(len(texts), dtype="float32")
+
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[row] = len(tokens)
+            term_counts = Counter(vocab.setdefault(token, len(vocab)) for token in tokens)
+            rows.extend([row] * len(term_counts))
+            cols.extend(term_counts.keys())
+            counts.extend(term_counts.values())
+
+        rows = np.asarray(rows, dtype="int64")
+        cols = np.asarray(cols, dtype="int64")
+        tf = np.asarray(counts, dtype="float32")
+
+        n_docs = len(texts)
+        df = np.bincount(cols, minlength=len(vocab))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        avg_len = max(float(doc_lens.mean()), 1.0) if n_docs else 1.0
+        length_norm = self.k1 * (1.0 - self.b + self.b * doc_lens[rows] / avg_len)
+        data = idf[cols] * tf * (self.k1 + 1.0) / (tf + length_norm)
+
+        self.weights = sparse.csc_matrix((data, (rows, cols)), shape=(n_docs, len(vocab)), dtype="float32")
+        self.vocab = vocab
+        self.fingerprint = fingerprint
+        return self
+
+    def scores(self, query: str):
+        """BM25 score of every doc for `query` (0 for docs sharing no term)."""
+        term_counts = Counter(self.vocab[t] for t in tokenize(query) if t in self.vocab)
+        if not term_counts:
+            return np.zeros(self.n_docs, dtype="float32")
+        cols = list(term_counts)
+        q = np.fromiter(term_counts.values(), dtype="float32", count=len(cols))
+        return self.weights[:, cols] @ q
+
+    def top(self, query: str, k: int):
+        """Rows and scores of the k best-matching docs (only docs with a matching term)."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        best = top_rows(scores[matched], min(k, len(matched)))
+        return matched[best], scores[matched[best]]
+
+    def save(self, path):
+        """Write to a private temp dir and swap it in, like the vector store (safe with concurrent savers)."""
+        with atomic_dir(path) as tmp_path:
+            sparse.save_npz(os.path.join(tmp_path, "weights.npz"), self.weights, compressed=False)
+            terms = sorted(self.vocab, key=self.vocab.get)
+            with open(os.path.join(tmp_path, "vocab.json"), "w", encoding="utf-8") as f:
+                json.dump(terms, f, ensure_ascii=False)
+            with open(os.path.join(tmp_path, "header.json"), "w", encoding="utf-8") as f:
+                json.dump({"k1": self.k1, "b": self.b, "count": self.n_docs, "fingerprint": self.fingerprint}, f)
+
+    @classmethod
+    def load(cls, path):
+        """The saved index at `path`, or None if there is none (or it is unreadable)."""
+        try:
+            with open(os.path.join(path, "header.json"), "r", encoding="utf-8") as f:
+                header = json.load(f)
+            with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+                terms = json.load(f)
+            weights = sparse.load_npz(os.path.join(path, "weights.npz")).tocsc()
+        except (OSError, ValueError):
+            return None
+
+        index = cls(k1=header["k1"], b=header["b"])
+        index.vocab = {term: col for col, term in enumerate(terms)}
+        index.weights = weights
+        index.fingerprint = header.get("fingerprint")
+        return index
+
+
+def load_or_build(vector_store, path=None):
+    """The BM25 index for the store's current contents: loaded from `path` if it is up to date, else rebuilt (and saved)."""
+    fingerprint = store_fingerprint(vector_store)
+    index = BM25Index.load(path) if path else None
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+
+    texts = [section_text(text, metadata) for text, metadata in zip(vector_store.texts, vector_store.metadatas)]
+    index = BM25Index().build(texts, fingerprint)
+    if path:
+        index.save(path)
+    return index
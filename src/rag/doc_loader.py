@@ -1,25 +1,113 @@
 import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import src.utils.config as config
+from src.utils.tokens import count_tokens
 
-def load_text_documents(doc_dir):
-    docs = []
-    for filename in os.listdir(doc_dir):
-        if not filename.endswith(".txt"):
+# A sentence (or line) plus the whitespace after it; the pieces concatenate back to the text
+_SENTENCE_RE = re.compile(r"[^\n.!?]*(?:[.!?]+|\n|$)\s*")
+_WORD_RE = re.compile(r"\S+\s*")
+
+
+def _split_long(piece, max_tokens):
+    """Split a single over-long sentence into word runs of at most `max_tokens`."""
+    parts, current = [], ""
+    for word in _WORD_RE.findall(piece):
+        if current and count_tokens(current + word) > max_tokens:
+            parts.append(current)
+            current = ""
+        current += word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _chunk_text(text, max_tokens, overlap_tokens):
+    """
+    Pack whole sentences into chunks of at most `max_tokens`, each starting with
+    up to `overlap_tokens` of trailing sentences from the previous chunk.
+    Returns (chunk_text, overlap_chars) pairs: the first `overlap_chars` characters
+    of a chunk repeat the end of the previous one.
+    """
+    pieces = []
+    for piece in _SENTENCE_RE.findall(text):
+        if piece:
+            pieces.extend(_split_long(piece, max_tokens) if count_tokens(piece) > max_tokens else [piece])
+
+    chunks = []
+    current, current_tokens, overlap = [], 0, 0
+    for piece in pieces:
+        n_tokens = count_tokens(piece)
+        if current and current_tokens + n_tokens > max_tokens:
+            chunks.append(("".join(current).strip(), overlap))
+            carry, carry_tokens = [], 0
+            for prev in reversed(current):
+                if carry_tokens + count_tokens(prev) > overlap_tokens:
+                    break
+                carry.insert(0, prev)
+                carry_tokens += count_tokens(prev)
+            if carry_tokens + n_tokens > max_tokens:
+                carry, carry_tokens = [], 0
+            current, current_tokens, overlap = carry, carry_tokens, len("".join(carry))
+        current.append(piece)
+        current_tokens += n_tokens
+    if current:
+        chunks.append(("".join(current).strip(), overlap))
+    return chunks
+
+
+def chunk_documents(docs, max_tokens: int = None, overlap_tokens: int = None):
+    """
+    Split sections longer than `max_tokens` (CHUNK_MAX_TOKENS; 0 disables) into
+    sentence-aligned, overlapping chunks with ids "{section id}#chunk{n}".
+    Chunks keep the section's metadata and add parent_id / chunk_index / n_chunks /
+    overlap (see _chunk_text). Sections that already fit pass through unchanged.
+    """
+    max_tokens = config.CHUNK_MAX_TOKENS if max_tokens is None else max_tokens
+    overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    chunked = []
+    for doc in docs:
+        if max_tokens <= 0 or count_tokens(doc["text"]) <= max_tokens:
+            chunked.append(doc)
             continue
 
-        path = os.path.join(doc_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read().strip()
-
-        lines = text.split("\n")
-        
-        # Split file into sections by topic headers
-        sections = []
-        current_section = {"topics": None, "content": []}
-        
-        for line in lines:
+        chunks = _chunk_text(doc["text"], max_tokens, overlap_tokens)
+        for idx, (text, overlap) in enumerate(chunks):
+            chunked.append({
+                "id": f"{doc['id']}#chunk{idx+1}",
+                "text": text,
+                "metadata": dict(
+                    doc["metadata"],
+                    parent_id=doc["id"],
+                    chunk_index=idx,
+                    n_chunks=len(chunks),
+                    overlap=overlap,
+                ),
+            })
+    return chunked
+
+
+def parse_text_file(path):
+    """Sections of one doc file, read line by line (see load_text_documents)."""
+    filename = os.path.basename(path)
+    docs = []
+    # Lines are kept only for this file: the whole file is one doc if it has no sections
+    lines = []
+
+    # Split file into sections by topic headers
+    sections = []
+    current_section = {"topics": None, "content": []}
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            lines.append(line)
             line_stripped = line.strip()
             line_lower = line_stripped.lower()
-            
+
             # Check if this line is a topic header (supports #topic:, topic:, #topic1:, topic1:, topic 20:, etc.)
             # Handles: #Topic1:, Topic4:, Topic 20:, etc.
             is_topic_header = (
@@ -30,7 +118,7 @@ def load_text_documents(doc_dir):
                 # Save previous section if it has content
                 if current_section["topics"] is not None and current_section["content"]:
                     sections.append(current_section)
-                
+
                 # Start new section
                 # Extract topics after the colon (handles #topic: or #topic1:, etc.)
                 colon_idx = line_lower.index(":")
@@ -40,37 +128,96 @@ def load_text_documents(doc_dir):
             else:
                 # Add line to current section
                 current_section["content"].append(line)
-        
-        # Don't forget the last section
-        if current_section["topics"] is not None and current_section["content"]:
-            sections.append(current_section)
-        
-        # If no topic headers found, treat entire file as one document
-        if not sections:
-            # default topic = filename
-            topics = [filename.replace(".txt", "")]
-            text_content = text
-            docs.append({
-                "id": filename,
-                "text": text_content,
-                "metadata": {
-                    "source": filename,
-                    "topics": topics
-                }
-            })
-        else:
-            # Create a document for each section
-            for idx, section in enumerate(sections):
-                text_content = "\n".join(section["content"]).strip()
-                if text_content:  # Only add non-empty sections
-                    doc_id = f"{filename}#section{idx+1}" if len(sections) > 1 else filename
-                    docs.append({
-                        "id": doc_id,
-                        "text": text_content,
-                        "metadata": {
-                            "source": filename,
-                            "topics": section["topics"]
-                        }
-                    })
 
+    # Trailing blank lines do not count as content (the file is read as if stripped)
+    while current_section["content"] and not current_section["content"][-1].strip():
+        current_section["content"].pop()
+
+    # Don't forget the last section
+    if current_section["topics"] is not None and current_section["content"]:
+        sections.append(current_section)
+
+    # If no topic headers found, treat entire file as one document
+    if not sections:
+        # default topic = filename
+        topics = [filename.replace(".txt", "")]
+        text_content = "\n".join(lines).strip()
+        docs.append({
+            "id": filename,
+            "text": text_content,
+            "metadata": {
+                "source": filename,
+                "topics": topics
+            }
+        })
+    else:
+        # Create a document for each section
+        for idx, section in enumerate(sections):
+            text_content = "\n".join(section["content"]).strip()
+            if text_content:  # Only add non-empty sections
+                doc_id = f"{filename}#section{idx+1}" if len(sections) > 1 else filename
+                docs.append({
+                    "id": doc_id,
+                    "text": text_content,
+                    "metadata": {
+                        "source": filename,
+                        "topics": section["topics"]
+                    }
+                })
+
+    return docs
+
+
+def _load_files(paths, max_tokens, overlap_tokens):
+    """Parse + chunk a group of files (one process-pool task)."""
+    docs = []
+    for path in paths:
+        docs.extend(chunk_documents(parse_text_file(path), max_tokens, overlap_tokens))
     return docs
+
+
+def list_doc_files(doc_dir):
+    """Paths of the .txt doc files in `doc_dir`, in filename order."""
+    return [
+        os.path.join(doc_dir, filename)
+        for filename in sorted(os.listdir(doc_dir))
+        if filename.endswith(".txt")
+    ]
+
+
+def iter_text_documents(doc_dir, workers: int = None, max_tokens: int = None, overlap_tokens: int = None):
+    """
+    Stream sections (chunked, as load_text_documents returns them) file by file,
+    in filename order. With `workers` > 1 (LOADER_WORKERS; 0 = up to
+    LOADER_MAX_DEFAULT_WORKERS cores) files
+    are parsed in a process pool, in groups of LOADER_FILES_PER_TASK, with a
+    bounded number of groups in flight so memory stays flat on huge corpora.
+    """
+    workers = config.LOADER_WORKERS if workers is None else workers
+    workers = workers or min(os.cpu_count() or 1, config.LOADER_MAX_DEFAULT_WORKERS)
+    max_tokens = config.CHUNK_MAX_TOKENS if max_tokens is None else max_tokens
+    overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    paths = list_doc_files(doc_dir)
+    if workers <= 1:
+        for path in paths:
+            yield from chunk_documents(parse_text_file(path), max_tokens, overlap_tokens)
+        return
+
+    groups = [paths[i:i + config.LOADER_FILES_PER_TASK] for i in range(0, len(paths), config.LOADER_FILES_PER_TASK)]
+    # spawn, not fork: callers often hold torch thread pools / live threads already
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        pending = deque()
+        for group in groups:
+            pending.append(pool.submit(_load_files, group, max_tokens, overlap_tokens))
+            # Workers stay a few groups ahead of the consumer (e.g. the embedder)
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def load_text_documents(doc_dir, max_tokens: int = None, overlap_tokens: int = None):
+    """All sections of the .txt files in `doc_dir` as a list (parsed in this process)."""
+    # Long sections become bounded chunks (ids of sections that fit are unchanged)
+    return list(iter_text_documents(doc_dir, workers=1, max_tokens=max_tokens, overlap_tokens=overlap_tokens))
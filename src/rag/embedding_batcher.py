@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects single texts submitted from many threads and encodes them together.
+    A batch is flushed `window_ms` after its first text arrives, or as soon as it
+    holds `max_batch` texts; each caller gets its own row back via a Future.
+    """
+
+    def __init__(self, encode_fn, window_ms: float = 5, max_batch: int = 32):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        # Orders submit() against close(): nothing is queued behind the stop marker
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str):
+        """Blocking helper: the embedding row for `text`."""
+        return self.submit(text).result()
+
+    def close(self):
+        """Encode what was submitted before close, then stop; anything left over fails instead of hanging."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("MicroBatcher is closed"))
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        self.batches += 1
+        try:
+            vectors = self.encode_fn([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
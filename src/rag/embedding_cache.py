@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Cache key normalization: trim and collapse whitespace."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Bounded, thread-safe LRU of query embeddings keyed by (model name, normalized text).
+    If `cache_dir` is set, entries are also written there as .npy files so the
+    cache survives restarts (memory misses fall back to disk before encoding).
+    """
+
+    def __init__(self, max_size: int = 1024, cache_dir: str = None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(model_name, text):
+        return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, model_name: str, text: str):
+        key = self._key(model_name, normalize_text(text))
+
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        if self.cache_dir:
+            try:
+                embedding = np.load(self._disk_path(key), allow_pickle=False)
+            except (OSError, ValueError):
+                embedding = None
+            if embedding is not None:
+                embedding = self._remember(key, embedding)
+                with self._lock:
+                    self.disk_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, text: str, embedding):
+        key = self._key(model_name, normalize_text(text))
+        embedding = self._remember(key, embedding)
+
+        if self.cache_dir:
+            # Write to a temp file then rename, so readers never see a partial .npy
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, embedding, allow_pickle=False)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Could not persist query embedding: {e}")
+
+        return embedding
+
+    def _remember(self, key, embedding):
+        embedding = np.array(embedding, dtype="float32")
+        embedding.setflags(write=False)  # shared between callers
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
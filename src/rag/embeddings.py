@@ -1,16 +1,43 @@
 from sentence_transformers import SentenceTransformer
 import src.utils.config as config
+from src.rag.embedding_cache import EmbeddingCache, normalize_text
+from src.rag.embedding_batcher import MicroBatcher
 
 class Embedder:
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, cache: EmbeddingCache = None):
         self.model_name = model_name or config.EMBEDDING_MODEL
         self.model = SentenceTransformer(self.model_name)
 
-    def embed(self, texts):
+        # Query cache is optional: QUERY_CACHE_SIZE=0 disables it
+        if cache is None and config.QUERY_CACHE_SIZE > 0:
+            cache = EmbeddingCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_DIR)
+        self.cache = cache
+
+        # Concurrent single-query encodes are coalesced into one batch (0 disables)
+        self.batcher = None
+        if config.EMBED_BATCH_WINDOW_MS > 0:
+            self.batcher = MicroBatcher(self.embed, config.EMBED_BATCH_WINDOW_MS, config.EMBED_MAX_BATCH)
+
+    def embed(self, texts, batch_size: int = None):
         if isinstance(texts, str):
             texts = [texts]
         return self.model.encode(
             texts,
+            batch_size=batch_size or config.EMBEDDING_BATCH_SIZE,
             convert_to_numpy=True,
             show_progress_bar=False
         )
+
+    def embed_query(self, text: str):
+        """Embed a single query (1-D vector), served from the query cache when possible."""
+        text = normalize_text(text)
+        if self.cache is not None:
+            embedding = self.cache.get(self.model_name, text)
+            if embedding is not None:
+                return embedding
+
+        embedding = self.batcher.embed(text) if self.batcher else self.embed(text)[0]
+
+        if self.cache is not None:
+            embedding = self.cache.put(self.model_name, text, embedding)
+        return embedding
@@ -1,17 +1,123 @@
+import hashlib
+import json
 import uuid
+import numpy as np
+import src.utils.config as config
+from src.utils.tokens import count_tokens
+
+def content_hash(doc):
+    """Stable hash of a doc's text + metadata (as produced by doc_loader)."""
+    payload = json.dumps(
+        {"text": doc["text"], "metadata": doc.get("metadata", {})},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def section_metadata(doc):
+    """A doc's metadata plus its token count, precomputed here so prompts never re-count it."""
+    return dict(doc.get("metadata", {}), n_tokens=count_tokens(doc["text"]))
+
 
 class Indexer:
-    def __init__(self, embedder, vector_store):
+    def __init__(self, embedder, vector_store, batch_size: int = None):
         self.embedder = embedder
         self.vector_store = vector_store
+        self.batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+
+    def _embed_all(self, texts):
+        """Embed texts in batches into one preallocated float32 array."""
+        embeddings = None
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.embedder.embed(texts[start:start + self.batch_size])
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch.shape[1]), dtype="float32")
+            embeddings[start:start + len(batch)] = batch
+        return embeddings
+
+    def index_documents(self, docs, batch_sections: int = None):
+        """
+        docs: iterable of dicts with keys: 'text' and optional 'metadata'.
+        Adds them (see add_documents) and saves the store. Returns the number of docs indexed.
+        """
+        n_indexed = self.add_documents(docs, batch_sections)
+        self.vector_store.save()
+        return n_indexed
+
+    def add_documents(self, docs, batch_sections: int = None):
+        """
+        Embed and append docs in batches of `batch_sections` (INDEX_BATCH_SECTIONS),
+        so a streaming loader (iter_text_documents) keeps parsing while a batch embeds.
+        """
+        batch_sections = batch_sections or config.INDEX_BATCH_SECTIONS
+        n_indexed = 0
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_sections:
+                self._add_batch(batch)
+                n_indexed += len(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+            n_indexed += len(batch)
+        return n_indexed
+
+    def _add_batch(self, docs):
+        ids = [doc.get("id") or str(uuid.uuid4()) for doc in docs]
+        texts = [doc["text"] for doc in docs]
+        metadatas = [section_metadata(doc) for doc in docs]
+        hashes = [content_hash(doc) for doc in docs]
+        self.vector_store.add_many(ids, texts, self._embed_all(texts), metadatas, hashes)
 
-    def index_documents(self, docs):
+    def _backfill_token_counts(self):
+        """Add n_tokens to sections indexed before it was stored (at sync time, before serving). Returns how many."""
+        n_backfilled = 0
+        for text, metadata in zip(self.vector_store.texts, self.vector_store.metadatas):
+            if metadata is not None and "n_tokens" not in metadata:
+                metadata["n_tokens"] = count_tokens(text)
+                n_backfilled += 1
+        return n_backfilled
+
+    def sync(self, docs):
         """
-        docs: iterable of dicts with keys: 'text' and optional 'metadata'
+        Incrementally bring the store in line with `docs`: only new or changed
+        sections (by id + content hash) are embedded, deleted ones are dropped.
+        Returns counts of added / updated / removed / unchanged docs.
         """
+        wanted = {}
         for doc in docs:
             doc_id = doc.get("id") or str(uuid.uuid4())
-            text = doc["text"]
-            embedding = self.embedder.embed(text)[0]
-            self.vector_store.add(doc_id, text, embedding, doc.get("metadata", {}))
-        self.vector_store.save()
\ No newline at end of file
+            wanted[doc_id] = (doc, content_hash(doc))
+
+        current = dict(zip(self.vector_store.ids, self.vector_store.hashes))
+        removed = [doc_id for doc_id in current if doc_id not in wanted]
+        updated = [doc_id for doc_id in current if doc_id in wanted and current[doc_id] != wanted[doc_id][1]]
+        added = [doc_id for doc_id in wanted if doc_id not in current]
+
+        self.vector_store.remove(removed + updated)
+
+        stale = set(updated)
+        to_embed = [doc_id for doc_id in wanted if doc_id not in current or doc_id in stale]
+        if to_embed:
+            texts = [wanted[doc_id][0]["text"] for doc_id in to_embed]
+            self.vector_store.add_many(
+                to_embed,
+                texts,
+                self._embed_all(texts),
+                [section_metadata(wanted[doc_id][0]) for doc_id in to_embed],
+                [wanted[doc_id][1] for doc_id in to_embed],
+            )
+
+        backfilled = self._backfill_token_counts()
+
+        if removed or to_embed or backfilled:
+            self.vector_store.save()
+
+        return {
+            "added": len(added),
+            "updated": len(updated),
+            "removed": len(removed),
+            "unchanged": len(wanted) - len(added) - len(updated),
+        }
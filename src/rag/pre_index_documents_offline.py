@@ -1,21 +1,166 @@
+"""
+Offline vector store build.
+
+    python -m src.rag.pre_index_documents_offline                 # one process
+    python -m src.rag.pre_index_documents_offline --workers 16    # sharded
+
+With --workers N the doc files (in filename order) are cut into N contiguous
+shards of roughly equal size. Each shard is embedded by its own process (own
+SentenceTransformer, --torch-threads threads) into {output}.shards/shard-NNNN,
+then the shards are merged in order into the store at --output. The merged
+store has the same rows, in the same order, as a single-process build.
+"""
+import argparse
 import os
-from src.rag.embeddings import Embedder
+import shutil
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
 from src.storage.vector_store import InMemoryVectorStore
 from src.rag.indexer import Indexer
-from src.rag.doc_loader import load_text_documents
+from src.rag.doc_loader import chunk_documents, iter_text_documents, list_doc_files, parse_text_file
 import src.utils.config as config
 
-def build_vector_store():
-    print("🔨 Building vector store offline...")
 
-    embedder = Embedder()
+def _default_embedder():
+    # Imported here: each worker process loads its own model
+    from src.rag.embeddings import Embedder
+    return Embedder()
+
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@contextmanager
+def _worker_env(torch_threads):
+    """
+    Thread limits for spawned workers. They must be in the environment before a
+    worker starts: BLAS/OpenMP read them once, when numpy/torch are first
+    imported (the spawn bootstrap imports them before any initializer runs).
+    """
+    values = {var: str(torch_threads) for var in _THREAD_ENV_VARS}
+    values["TOKENIZERS_PARALLELISM"] = "false"
+    saved = {var: os.environ.get(var) for var in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _init_worker(torch_threads):
+    """Pin each worker's torch pools to its share of the cores (no oversubscription)."""
+    try:
+        import torch
+    except ImportError:
+        return  # embedder without torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+
+def partition_files(paths, n_shards):
+    """Split `paths` into at most `n_shards` contiguous runs of roughly equal total size."""
+    sizes = [os.path.getsize(path) for path in paths]
+    target = sum(sizes) / max(1, n_shards)
+    shards = [[]]
+    total = 0
+    for path, size in zip(paths, sizes):
+        if shards[-1] and len(shards) < n_shards and total >= target * len(shards):
+            shards.append([])
+        shards[-1].append(path)
+        total += size
+    return [shard for shard in shards if shard]
+
+
+def build_shard(shard_path, paths, embedder_factory=None):
+    """Embed the docs of `paths` into a float32 store at `shard_path`. Returns the doc count."""
+    embedder = (embedder_factory or _default_embedder)()
+    store = InMemoryVectorStore()
+    docs = (doc for path in paths for doc in chunk_documents(parse_text_file(path)))
+    n_docs = Indexer(embedder, store).add_documents(docs)
+    store.save(shard_path, dtype="float32")
+    return n_docs
+
+
+def merge_shards(shard_paths, output):
+    """Concatenate shard stores in the given order into one store at `output`."""
     store = InMemoryVectorStore()
-    indexer = Indexer(embedder, store)
+    for path in shard_paths:
+        shard = InMemoryVectorStore()
+        shard.load(path)
+        if shard.ids:
+            store.add_many(list(shard.ids), list(shard.texts), shard.embeddings, shard.metadatas, shard.hashes)
+    store.save(output)
+    return store
+
+
+def build_vector_store(docs_dir=None, output=None, workers=1, torch_threads=None, keep_shards=False, embedder_factory=None):
+    print("🔨 Building vector store offline...")
+    docs_dir = docs_dir or config.DOCS_DIR
+    output = output or config.VECTOR_STORE_PATH
+
+    if workers <= 1:
+        embedder = (embedder_factory or _default_embedder)()
+        store = InMemoryVectorStore()
+        # Files are parsed in worker processes while the previous batch is embedded
+        n_docs = Indexer(embedder, store).add_documents(iter_text_documents(docs_dir))
+        store.save(output)
+        print(f"✅ Indexed {n_docs} sections")
+        print("✅ Saved to:", output)
+        return store
+
+    shards = partition_files(list_doc_files(docs_dir), workers)
+    if not shards:
+        # No doc files: an empty store, like the single-process path
+        store = InMemoryVectorStore()
+        store.save(output)
+        print("✅ Indexed 0 sections")
+        print("✅ Saved to:", output)
+        return store
+    torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // len(shards))
+    shard_dir = f"{output}.shards"
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.makedirs(shard_dir)
+    shard_paths = [os.path.join(shard_dir, f"shard-{idx:04d}") for idx in range(len(shards))]
+
+    print(f"🧩 {len(shards)} shards, {torch_threads} torch threads per worker")
+    # spawn: torch is not fork-safe once its thread pools exist
+    with _worker_env(torch_threads), ProcessPoolExecutor(
+        max_workers=len(shards),
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(torch_threads,),
+    ) as pool:
+        futures = [
+            pool.submit(build_shard, shard_path, paths, embedder_factory)
+            for shard_path, paths in zip(shard_paths, shards)
+        ]
+        for idx, future in enumerate(futures):
+            print(f"  ✅ shard {idx}: {future.result()} sections")
+
+    store = merge_shards(shard_paths, output)
+    if not keep_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    print(f"✅ Indexed {len(store.ids)} sections")
+    print("✅ Saved to:", output)
+    return store
+
 
-    docs = load_text_documents(config.DOCS_DIR)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs-dir", default=config.DOCS_DIR)
+    parser.add_argument("--output", default=config.VECTOR_STORE_PATH)
+    parser.add_argument("--workers", type=int, default=1, help="embedding processes (one shard each)")
+    parser.add_argument("--torch-threads", type=int, default=None, help="threads per worker (default: cores / workers)")
+    parser.add_argument("--keep-shards", action="store_true", help="keep the per-shard stores after merging")
+    args = parser.parse_args()
+    build_vector_store(args.docs_dir, args.output, args.workers, args.torch_threads, args.keep_shards)
 
-    indexer.index_documents(docs)
-    print("✅ Saved to:", config.VECTOR_STORE_PATH)
 
 if __name__ == "__main__":
-    build_vector_store()
+    main()
@@ -1,71 +1,169 @@
+import threading
+
+import src.utils.config as config
+from src.rag import bm25
+
+
 class Retriever:
     def __init__(self, embedder, vector_store):
         self.embedder = embedder
         self.vector_store = vector_store
 
-    def retrieve(self, query: str, top_k: int = 3):
-        query_lower = query.lower()
-        query_words = set(query_lower.split())  # Split query into words
+    def may_match(self, query: str):
+        """False if retrieve() is sure to return nothing (no topic matches), without embedding."""
+        return bool(self.vector_store.topic_mask(query).any())
 
+    def retrieve(self, query: str, top_k: int = 3, query_embedding=None):
+        """`query_embedding` skips re-embedding when the caller already has it."""
         # ================================
         # 1️⃣ TOPIC FILTERING (very important)
         # ================================
-        valid_indices = []
-        for i, metadata in enumerate(self.vector_store.metadatas):
-            topics = metadata.get("topics", [])
-            # Check if ANY topic matches:
-            # - Topic phrase is in query (e.g., "love stress" in "love stress")
-            # - OR any word from topic is in query (e.g., "love" or "stress" in "love stress")
-            matches = False
-            for topic in topics:
-                topic_lower = topic.lower()
-                # Check if full topic phrase is in query
-                if topic_lower in query_lower:
-                    matches = True
-                    break
-                # Check if any word from topic is in query
-                topic_words = set(topic_lower.split())
-                if topic_words & query_words:  # Intersection of sets
-                    matches = True
-                    break
-            
-            if matches:
-                valid_indices.append(i)
+        # Inverted topic index on the store: a doc matches if
+        # - a topic phrase is in the query (e.g., "love stress" in "love stress")
+        # - OR any word from a topic is a query word (e.g., "love" or "stress")
+        mask = self.vector_store.topic_mask(query)
 
         # If NO matching topical docs → return empty
-        if len(valid_indices) == 0:
+        if not mask.any():
             return []
 
         # ================================
-        # 2️⃣ Filter embeddings & docs by topic
+        # 2️⃣ Semantic similarity (only on topic-matched docs)
         # ================================
-        filtered_embeddings = self.vector_store.embeddings[valid_indices]
-        filtered_ids = [self.vector_store.ids[i] for i in valid_indices]
-        filtered_texts = [self.vector_store.texts[i] for i in valid_indices]
-        filtered_metadatas = [self.vector_store.metadatas[i] for i in valid_indices]
+        q_emb = query_embedding if query_embedding is not None else self.embedder.embed_query(query)
+
+        return self.vector_store.query(q_emb, top_k=top_k, mask=mask)
+
+
+class HybridRetriever:
+    """
+    BM25 + dense retrieval fused with reciprocal rank fusion: a doc scores
+    sum(1 / (rrf_k + rank)) over the two rankings (top `candidates` of each).
+    There is no hard topic filter: topics are part of the BM25 text, so a topic
+    word in the query still lifts its sections without excluding the rest.
+    Results keep `score` = cosine distance and add `rrf`.
+    """
+
+    def __init__(self, embedder, vector_store, index_path: str = None, candidates: int = None, rrf_k: int = None):
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.index_path = index_path or config.BM25_INDEX_PATH
+        self.candidates = candidates or config.HYBRID_CANDIDATES
+        self.rrf_k = rrf_k or config.HYBRID_RRF_K
+        self._bm25 = None
+        self._version = None
+        self._lock = threading.Lock()
+        self.bm25()  # load or build now, not on the first request
+
+    def bm25(self):
+        """BM25 index matching the store's current contents (rebuilt after the store changes)."""
+        version = self.vector_store.version
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._bm25 = bm25.load_or_build(self.vector_store, self.index_path)
+                    self._version = version
+        return self._bm25
+
+    def may_match(self, query: str):
+        """False if retrieve() is sure to return nothing (empty store)."""
+        return bool(self.vector_store.ids)
+
+    def retrieve(self, query: str, top_k: int = 3, query_embedding=None):
+        """`query_embedding` skips re-embedding when the caller already has it."""
+        index = self.bm25()
+        store = self.vector_store
+        if not store.ids:
+            return []
+
+        n_candidates = max(top_k, self.candidates)
+        q_emb = query_embedding if query_embedding is not None else self.embedder.embed_query(query)
+        dense = store.query(q_emb, top_k=n_candidates)
+        sparse_rows, _ = index.top(query, n_candidates)
+
+        fused = {}
+        results = {}
+        for rank, doc in enumerate(dense):
+            fused[doc["id"]] = 1.0 / (self.rrf_k + rank + 1)
+            results[doc["id"]] = doc
+        rows = {}
+        for rank, row in enumerate(sparse_rows):
+            doc_id = store.ids[row]
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            rows[doc_id] = row
+
+        best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+
+        # BM25-only winners still get a cosine distance, so `score` means the same in both modes
+        missing = [doc_id for doc_id in best if doc_id not in results]
+        if missing:
+            distances = store.distances(q_emb, [rows[doc_id] for doc_id in missing])
+            for doc_id, distance in zip(missing, distances):
+                row = rows[doc_id]
+                results[doc_id] = {
+                    "id": doc_id,
+                    "text": store.texts[row],
+                    "metadata": store.metadatas[row],
+                    "score": float(distance),
+                }
+
+        return [dict(results[doc_id], rrf=fused[doc_id]) for doc_id in best]
 
-        # ================================
-        # 3️⃣ Semantic similarity (only on topic-matched docs)
-        # ================================
-        q_emb = self.embedder.embed(query)[0]
-
-        # Use temporary vector_store-like search
-        from sklearn.neighbors import NearestNeighbors
-        nn = NearestNeighbors(
-            n_neighbors=min(top_k, len(filtered_embeddings)),
-            metric="cosine"
-        )
-        nn.fit(filtered_embeddings)
-
-        distances, indices = nn.kneighbors(q_emb.reshape(1, -1))
-
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            results.append({
-                "id": filtered_ids[idx],
-                "text": filtered_texts[idx],
-                "metadata": filtered_metadatas[idx],
-                "score": float(dist)
-            })
 
+def create_retriever(embedder, vector_store, mode: str = None):
+    """Retriever for RETRIEVER_MODE: "topic" (topic filter + cosine) or "hybrid" (BM25 + dense)."""
+    mode = mode or config.RETRIEVER_MODE
+    if mode == "hybrid":
+        return HybridRetriever(embedder, vector_store)
+    if mode == "topic":
+        return Retriever(embedder, vector_store)
+    raise ValueError(f"Unknown retriever mode: {mode!r} (expected topic or hybrid)")
+
+
+def expand_neighbours(results, vector_store, window: int = None):
+    """
+    Widen each retrieved chunk with up to `window` (CHUNK_EXPAND_WINDOW) neighbouring
+    chunks of the same section on each side, so the prompt sees the surrounding
+    text. A chunk already covered by a better-ranked result is dropped; whole
+    sections (no parent_id) pass through unchanged.
+    """
+    window = config.CHUNK_EXPAND_WINDOW if window is None else window
+    if window <= 0:
         return results
+
+    expanded = []
+    covered = {}  # parent_id -> chunk indexes already in the results
+    for doc in results:
+        metadata = doc["metadata"]
+        parent_id = metadata.get("parent_id")
+        if parent_id is None:
+            expanded.append(doc)
+            continue
+
+        idx = metadata["chunk_index"]
+        seen = covered.setdefault(parent_id, set())
+        if idx in seen:
+            continue
+
+        first = max(0, idx - window)
+        last = min(metadata["n_chunks"] - 1, idx + window)
+        parts = []
+        for i in range(first, last + 1):
+            chunk = doc if i == idx else vector_store.get(f"{parent_id}#chunk{i+1}")
+            if chunk is None or i in seen:
+                # Missing or already sent neighbour: keep the expanded text contiguous
+                if i < idx:
+                    parts = []
+                    continue
+                break
+            parts.append(chunk)
+        seen.update(part["metadata"]["chunk_index"] for part in parts)
+
+        # Later chunks start with `overlap` characters repeated from the previous one
+        text = parts[0]["text"]
+        for part in parts[1:]:
+            text += "\n" + part["text"][part["metadata"].get("overlap", 0):]
+        counts = [part["metadata"].get("n_tokens") for part in parts]
+        n_tokens = sum(counts) if None not in counts else None  # None: prompt builder counts it
+        expanded.append(dict(doc, text=text, metadata=dict(metadata, n_tokens=n_tokens)))
+    return expanded
@@ -1,53 +1,201 @@
 import json
 import os
+import threading
+from collections import deque
 import src.utils.config as config
 from datetime import datetime
+from src.storage.io_executor import run_io
+
+
+def _read_tail_lines(path, n, block_size=8192):
+    """Last `n` complete lines of a file, read backwards block by block."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        while end > 0 and data.count(b"\n") <= n:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+
+    lines = data.split(b"\n")
+    if end > 0:
+        lines = lines[1:]  # first piece may be the middle of a line
+    return [line for line in lines if line.strip()][-n:]
+
+
+def _parse_lines(lines):
+    messages = []
+    for line in lines:
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            continue  # torn write from a crash; dropped by the next compact()
+        messages.append(msg)
+    return messages
+
 
 class ChatHistory:
+    """
+    Per-user chat history stored as append-only JSONL ({email}.jsonl): each
+    message costs one appended line. Recent messages are kept in memory;
+    older ones are read from the tail of the file on demand.
+    """
+
     def __init__(self, email: str):
-        # Each user gets their own JSON file
-        self.path = os.path.join(config.CHAT_HISTORY_DIR, f"{email}.json")
+        # Each user gets their own JSONL file
+        self.path = os.path.join(config.CHAT_HISTORY_DIR, f"{email}.jsonl")
+        # Older versions rewrote a whole JSON list per message
+        self.legacy_path = os.path.join(config.CHAT_HISTORY_DIR, f"{email}.json")
         os.makedirs(config.CHAT_HISTORY_DIR, exist_ok=True)
-        self._messages = []
+        self._tail = deque(maxlen=config.CHAT_HISTORY_TAIL)
+        self._needs_newline = False
+        self._stat = None  # (size, mtime_ns) of the file as of our last load / write
+        self._lock = threading.RLock()
         self.load()
 
     def add_user(self, text: str):
-        self._messages.append({
+        self._append({
             "role": "user",
             "content": text,
             "time": datetime.utcnow().isoformat()
         })
-        self.save()
 
     def add_assistant(self, text: str):
-        self._messages.append({
+        self._append({
             "role": "assistant",
             "content": text,
             "time": datetime.utcnow().isoformat()
         })
-        self.save()
+
+    @classmethod
+    async def aopen(cls, email: str):
+        """Awaitable constructor (loads the history file off the event loop)."""
+        return await run_io(cls, email)
+
+    async def aadd_user(self, text: str):
+        await run_io(self.add_user, text)
+
+    async def aadd_assistant(self, text: str):
+        await run_io(self.add_assistant, text)
 
     def last_n(self, n=6):
+        with self._lock:
+            if n <= self._tail.maxlen:
+                recent = list(self._tail)[-n:] if n > 0 else []
+            else:
+                recent = self._read_tail(n)
         return [
             {"role": msg["role"], "content": msg["content"]}
-            for msg in self._messages[-n:]
+            for msg in recent
         ]
 
+    def messages(self):
+        """Every stored message (reads the whole file)."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            with open(self.path, "rb") as f:
+                return _parse_lines(f.read().split(b"\n"))
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def is_stale(self):
+        """True if the file changed since we last loaded or wrote it (e.g. another worker appended)."""
+        return self._file_stat() != self._stat
+
+    def reload_if_changed(self):
+        with self._lock:
+            if not self.is_stale():
+                return False
+            self.load()
+            return True
+
+    def _append(self, msg):
+        line = json.dumps(msg, ensure_ascii=False) + "\n"
+        with self._lock:
+            # Pick up other writers' messages first so the tail stays in file order
+            self.reload_if_changed()
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self._needs_newline:
+                    # Previous process died mid-line: start on a fresh line
+                    f.write("\n")
+                    self._needs_newline = False
+                f.write(line)
+                if config.CHAT_HISTORY_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._tail.append(msg)
+            self._stat = self._file_stat()
+
+    def _read_tail(self, n):
+        if n <= 0 or not os.path.exists(self.path):
+            return []
+        # One spare line in case the last one is a torn write
+        return _parse_lines(_read_tail_lines(self.path, n + 1))[-n:]
+
+    def compact(self, keep_last: int = None):
+        """
+        Atomically rewrite the file with only valid lines (optionally just the
+        last `keep_last` messages): temp file + fsync + rename.
+        """
+        with self._lock:
+            messages = self.messages()
+            if keep_last is not None:
+                messages = messages[-keep_last:] if keep_last > 0 else []
+            self._write_all(messages)
+            self._tail.clear()
+            self._tail.extend(messages[-self._tail.maxlen:])
+
     def save(self):
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self._messages, f, ensure_ascii=False, indent=2)
+        self.compact()
+
+    def _write_all(self, messages):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._needs_newline = False
+        self._stat = self._file_stat()
 
     def load(self):
-        if os.path.exists(self.path):
-            try:
-                with open(self.path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-
-                    # Convert old format if needed
-                    for msg in data:
-                        if "text" in msg:
-                            msg["content"] = msg.pop("text")
-
-                    self._messages = data
-            except:
-                self._messages = []
+        with self._lock:
+            if not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+                self._migrate_legacy()
+
+            self._tail.clear()
+            self._needs_newline = False
+            self._stat = self._file_stat()
+            if self._stat is None:
+                return
+
+            self._tail.extend(self._read_tail(self._tail.maxlen))
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    self._needs_newline = f.read(1) != b"\n"
+
+    def _migrate_legacy(self):
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except:
+            return
+
+        # Convert old format if needed
+        for msg in data:
+            if "text" in msg:
+                msg["content"] = msg.pop("text")
+
+        self._write_all(data)
+        os.remove(self.legacy_path)
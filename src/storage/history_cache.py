@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+import src.utils.config as config
+from src.storage.chat_history import ChatHistory
+from src.storage.io_executor import run_io
+
+
+class _Slot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history = None
+        self.last_used = time.monotonic()
+
+
+class ChatHistoryCache:
+    """
+    Bounded, thread-safe LRU of loaded ChatHistory objects, one per user.
+
+    ChatHistory appends straight to its file, so the cache is write-through and
+    an evicted entry loses nothing. Overlapping requests for the same user get
+    the same instance (loaded once), whose own lock serializes appends. Each hit
+    compares the file's size and mtime with the cached copy's and reloads the
+    tail if another worker process has written to it.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or config.HISTORY_CACHE_SIZE
+        self.ttl = ttl or config.HISTORY_CACHE_TTL
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _slot(self, email):
+        now = time.monotonic()
+        with self._lock:
+            slot = self._slots.get(email)
+            if slot is not None and now - slot.last_used > self.ttl:
+                del self._slots[email]
+                slot = None
+
+            if slot is None:
+                slot = _Slot()
+                self._slots[email] = slot
+                self.misses += 1
+                while len(self._slots) > self.max_size:
+                    self._slots.popitem(last=False)
+            else:
+                self._slots.move_to_end(email)
+                self.hits += 1
+
+            slot.last_used = now
+            return slot
+
+    @staticmethod
+    def _load(slot, email):
+        if slot.history is None:
+            # Per-user lock: a second request for the same user waits for this load
+            with slot.lock:
+                if slot.history is None:
+                    slot.history = ChatHistory(email)
+                    return slot.history
+        slot.history.reload_if_changed()
+        return slot.history
+
+    def get(self, email: str) -> ChatHistory:
+        return self._load(self._slot(email), email)
+
+    async def aget(self, email: str) -> ChatHistory:
+        """Like get(), but a cold load runs on the storage IO pool."""
+        slot = self._slot(email)
+        history = slot.history
+        if history is not None and not history.is_stale():
+            return history
+        return await run_io(self._load, slot, email)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._slots.pop(email, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._slots), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
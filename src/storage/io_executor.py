@@ -0,0 +1,15 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import src.utils.config as config
+
+# Small dedicated pool for blocking storage calls (SQLite, history files), so the
+# async pipeline never ties up the request threadpool while waiting on disk
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=config.STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+
+
+async def run_io(fn, *args, **kwargs):
+    """Await a blocking storage call on the storage IO pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_IO_EXECUTOR, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,269 @@
+"""
+Sharded vector store: docs are partitioned by topic (or id hash) into several
+InMemoryVectorStore shards. A query scans only the shards that can match (topic
+routing through the mask), in parallel threads (BLAS releases the GIL), and the
+per-shard top-k lists are merged with a heap.
+
+It exposes the same interface as InMemoryVectorStore (ids / texts / metadatas /
+hashes / version, add_many, remove, topic_mask, query, get, distances, save,
+load), so Retriever, HybridRetriever and Indexer work with either. Global rows
+are the shards' rows concatenated in shard order.
+"""
+import heapq
+import itertools
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import src.utils.config as config
+from src.storage.vector_store import InMemoryVectorStore, _normalize_rows, resolve_store_path
+from src.utils.fs import atomic_dir
+
+SHARDS_FILE = "shards.json"
+
+
+class _Concat:
+    """Read-only sequence view over several sequences (e.g. every shard's texts)."""
+
+    def __init__(self, parts):
+        self._parts = parts
+        self._offsets = np.cumsum([0] + [len(part) for part in parts])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        shard = int(np.searchsorted(self._offsets, idx, side="right")) - 1
+        return self._parts[shard][idx - self._offsets[shard]]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._parts)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+class ShardedVectorStore:
+    def __init__(self, n_shards: int = None, partition: str = None, search_threads: int = None, quantization: str = None):
+        self.n_shards = n_shards or config.VECTOR_STORE_SHARDS
+        self.partition = partition or config.VECTOR_STORE_PARTITION
+        if self.partition not in ("topic", "hash"):
+            raise ValueError(f"Unknown partition: {self.partition!r} (expected topic or hash)")
+        self.shards = [InMemoryVectorStore(quantization=quantization) for _ in range(self.n_shards)]
+        self._search_threads = search_threads or config.SHARD_SEARCH_THREADS or min(self.n_shards, os.cpu_count() or 1)
+        self._pool = None
+        self._loads = 0
+        self._views = (None, None)  # (version, {"ids": ..., ...})
+
+    # ---------- global (concatenated) view ----------
+    @property
+    def version(self):
+        # Shard versions only grow, so the sum changes whenever any shard does
+        return self._loads + sum(shard.version for shard in self.shards)
+
+    def _view(self, name):
+        version, views = self._views
+        if version != self.version:
+            views = {}
+            self._views = (self.version, views)
+        if name not in views:
+            parts = [getattr(shard, name) for shard in self.shards]
+            views[name] = list(itertools.chain.from_iterable(parts)) if name == "ids" else _Concat(parts)
+        return views[name]
+
+    @property
+    def ids(self):
+        return self._view("ids")
+
+    @property
+    def texts(self):
+        return self._view("texts")
+
+    @property
+    def metadatas(self):
+        return self._view("metadatas")
+
+    @property
+    def hashes(self):
+        return self._view("hashes")
+
+    @property
+    def embeddings(self):
+        """All rows as one float32 matrix (a copy: for tools, not the query path)."""
+        parts = [np.asarray(shard.embeddings, dtype="float32") for shard in self.shards if shard.ids]
+        return np.concatenate(parts) if parts else None
+
+    def _offsets(self):
+        return np.cumsum([0] + [len(shard.ids) for shard in self.shards])
+
+    # ---------- writes ----------
+    def _shard_for(self, doc_id, metadata):
+        topics = (metadata or {}).get("topics") or []
+        # Topic partition keeps a topic's docs (and a section's chunks) in one shard
+        key = topics[0].lower() if self.partition == "topic" and topics else doc_id
+        return zlib.crc32(key.encode("utf-8")) % self.n_shards
+
+    def add(self, doc_id: str, text: str, embedding: np.ndarray, metadata: dict = None, content_hash: str = None):
+        self.add_many([doc_id], [text], np.asarray(embedding).reshape(1, -1), [metadata], [content_hash])
+
+    def add_many(self, ids, texts, embeddings, metadatas=None, hashes=None):
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        metadatas = metadatas or [None] * len(ids)
+        hashes = hashes or [None] * len(ids)
+        if not (len(ids) == len(texts) == len(metadatas) == len(hashes) == len(embeddings)):
+            raise ValueError("ids, texts, metadatas, hashes and embeddings must have the same length")
+
+        groups = {}
+        for i, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+            groups.setdefault(self._shard_for(doc_id, metadata), []).append(i)
+        for shard_idx, rows in sorted(groups.items()):
+            self.shards[shard_idx].add_many(
+                [ids[i] for i in rows],
+                [texts[i] for i in rows],
+                embeddings[rows],
+                [metadatas[i] for i in rows],
+                [hashes[i] for i in rows],
+            )
+
+    def remove(self, ids):
+        ids = set(ids)
+        for shard in self.shards:
+            shard.remove(ids)
+
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # ---------- reads ----------
+    def topic_mask(self, query: str):
+        """Global boolean row mask (see InMemoryVectorStore.topic_mask)."""
+        return np.concatenate([shard.topic_mask(query) for shard in self.shards])
+
+    def query(self, query_embedding, top_k=3, mask=None):
+        """
+        Top-k over all shards, or only rows where `mask` is True: shards with no
+        masked-in row are skipped, the rest are searched in parallel and their
+        sorted top-k lists heap-merged.
+        """
+        q = _normalize_rows(query_embedding)[0]
+        offsets = self._offsets()
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+
+        tasks = []
+        for idx, shard in enumerate(self.shards):
+            if not shard.ids:
+                continue
+            shard_mask = None
+            if mask is not None:
+                shard_mask = mask[offsets[idx]:offsets[idx + 1]]
+                if not shard_mask.any():
+                    continue  # topic routing: nothing in this shard can match
+            tasks.append((shard, shard_mask))
+
+        if not tasks:
+            return []
+        if len(tasks) == 1 or self._search_threads <= 1:
+            per_shard = [shard.query(q, top_k, shard_mask) for shard, shard_mask in tasks]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._search_threads, thread_name_prefix="shard-search")
+            futures = [self._pool.submit(shard.query, q, top_k, shard_mask) for shard, shard_mask in tasks]
+            per_shard = [future.result() for future in futures]
+
+        # Each list is sorted by distance already
+        return list(itertools.islice(heapq.merge(*per_shard, key=lambda doc: doc["score"]), top_k))
+
+    def get(self, doc_id):
+        for shard in self.shards:
+            doc = shard.get(doc_id)
+            if doc is not None:
+                return doc
+        return None
+
+    def distances(self, query_embedding, rows):
+        """Exact cosine distance of the query to the given global rows."""
+        offsets = self._offsets()
+        rows = np.asarray(rows, dtype="int64")
+        shard_of = np.searchsorted(offsets, rows, side="right") - 1
+        out = np.empty(len(rows), dtype="float32")
+        for shard_idx in np.unique(shard_of):
+            hits = shard_of == shard_idx
+            out[hits] = self.shards[shard_idx].distances(query_embedding, rows[hits] - offsets[shard_idx])
+        return out
+
+    # ---------- persistence ----------
+    def save(self, path=None, dtype=None):
+        """A directory with shards.json and one store directory per shard, written aside and swapped in whole (see atomic_dir)."""
+        path = path or config.SHARDED_VECTOR_STORE_PATH
+        with atomic_dir(path) as tmp_path:
+            for idx, shard in enumerate(self.shards):
+                shard.save(os.path.join(tmp_path, f"shard-{idx:04d}"), dtype=dtype)
+            with open(os.path.join(tmp_path, SHARDS_FILE), "w", encoding="utf-8") as f:
+                json.dump({"shards": self.n_shards, "partition": self.partition}, f)
+
+    def load(self, path=None):
+        """
+        Load a sharded store, or re-partition a plain store (directory or legacy
+        .npz) into this store's shards. Without a path the sharded store is tried
+        first, then the plain store. Returns True if something was loaded.
+        """
+        if path is None:
+            path = config.SHARDED_VECTOR_STORE_PATH
+            if not os.path.exists(os.path.join(path, SHARDS_FILE)):
+                path = resolve_store_path()
+        if not path or not os.path.exists(path):
+            return False
+
+        manifest = os.path.join(path, SHARDS_FILE)
+        if os.path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header["shards"] == self.n_shards and header["partition"] == self.partition:
+                for idx, shard in enumerate(self.shards):
+                    shard.load(os.path.join(path, f"shard-{idx:04d}"))
+                self._loads += 1
+                return True
+            # Different layout: re-partition below
+            sources = []
+            for idx in range(header["shards"]):
+                source = InMemoryVectorStore()
+                source.load(os.path.join(path, f"shard-{idx:04d}"))
+                sources.append(source)
+        else:
+            source = InMemoryVectorStore()
+            if not source.load(path):
+                return False
+            sources = [source]
+
+        self.clear()
+        for source in sources:
+            if source.ids:
+                self.add_many(list(source.ids), list(source.texts), source.embeddings, source.metadatas, source.hashes)
+        self._loads += 1
+        return True
+
+
+def create_vector_store():
+    """The configured store: sharded when VECTOR_STORE_SHARDS > 1, else one InMemoryVectorStore."""
+    if config.VECTOR_STORE_SHARDS > 1:
+        return ShardedVectorStore()
+    return InMemoryVectorStore()
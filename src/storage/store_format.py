@@ -0,0 +1,128 @@
+"""
+Pickle-free on-disk layout for InMemoryVectorStore (a directory):
+
+    header.json          format version, count, dim, embedding dtype
+    embeddings.bin       raw row-major float32/float16 matrix (opened with np.memmap)
+    ids.bin / ids.idx    UTF-8 blob + int64 offsets (n + 1)
+    texts.bin / texts.idx
+    hashes.bin / hashes.idx   ("" = no hash)
+    metadatas.json       JSON list, one object per row
+
+Embeddings and texts are memory-mapped read-only, so several worker processes
+share the same pages through the OS page cache and loading does not copy them.
+"""
+import json
+import os
+
+import numpy as np
+
+from src.utils.fs import atomic_dir
+
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+EMBEDDINGS_FILE = "embeddings.bin"
+
+
+class StringColumn:
+    """Read-only sequence of strings decoded on access from a memory-mapped UTF-8 blob."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _write_strings(dir_path, name, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(dir_path, f"{name}.bin"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    offsets.tofile(os.path.join(dir_path, f"{name}.idx"))
+
+
+def _read_strings(dir_path, name):
+    offsets = np.fromfile(os.path.join(dir_path, f"{name}.idx"), dtype="int64")
+    blob_path = os.path.join(dir_path, f"{name}.bin")
+    # np.memmap refuses empty files
+    if os.path.getsize(blob_path) == 0:
+        blob = np.zeros(0, dtype="uint8")
+    else:
+        blob = np.memmap(blob_path, dtype="uint8", mode="r")
+    return StringColumn(blob, offsets)
+
+
+def is_store_dir(path):
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+
+def write_store(path, ids, texts, metadatas, hashes, embeddings, dtype="float32"):
+    """Write to a private temp dir next to `path`, then swap it in (see atomic_dir): readers never see a half-written store."""
+    with atomic_dir(path) as tmp_path:
+        count = len(ids)
+        dim = 0 if embeddings is None else int(embeddings.shape[1])
+        if embeddings is not None:
+            np.ascontiguousarray(embeddings, dtype=dtype).tofile(os.path.join(tmp_path, EMBEDDINGS_FILE))
+        else:
+            open(os.path.join(tmp_path, EMBEDDINGS_FILE), "wb").close()
+
+        _write_strings(tmp_path, "ids", ids)
+        _write_strings(tmp_path, "texts", texts)
+        _write_strings(tmp_path, "hashes", [h or "" for h in hashes])
+        with open(os.path.join(tmp_path, "metadatas.json"), "w", encoding="utf-8") as f:
+            json.dump(list(metadatas), f, ensure_ascii=False)
+
+        with open(os.path.join(tmp_path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "format": FORMAT_VERSION,
+                "count": count,
+                "dim": dim,
+                "dtype": np.dtype(dtype).name,
+                "normalized": True,
+            }, f)
+
+
+def read_store(path):
+    with open(os.path.join(path, HEADER_FILE), "r", encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector store format: {header.get('format')}")
+
+    count, dim = header["count"], header["dim"]
+    embeddings = None
+    if count and dim:
+        embeddings = np.memmap(
+            os.path.join(path, EMBEDDINGS_FILE),
+            dtype=header["dtype"],
+            mode="r",
+            shape=(count, dim),
+        )
+
+    with open(os.path.join(path, "metadatas.json"), "r", encoding="utf-8") as f:
+        metadatas = json.load(f)
+
+    return {
+        "header": header,
+        "embeddings": embeddings,
+        "ids": list(_read_strings(path, "ids")),
+        "texts": _read_strings(path, "texts"),
+        "hashes": [h or None for h in _read_strings(path, "hashes")],
+        "metadatas": metadatas,
+    }
@@ -1,14 +1,114 @@
 import email
 import sqlite3
 import os
-import bcrypt
+import threading
+import weakref
+
+import src.utils.config as config
+from src.utils.security import hash_password
 
 
 # DB_PATH = os.path.join(os.path.dirname(__file__), "user_data.db")
-DB_PATH = "/var/data/user_data.db"
+DB_PATH = os.getenv("USER_DB_PATH", "/var/data/user_data.db")
+
+# One long-lived connection per thread (sqlite3 connections are not shareable
+# across threads); reusing it also reuses sqlite3's prepared-statement cache.
+# The connection is closed when its thread exits (the thread-local holder is
+# collected) or on close_connections(), so short-lived threads do not leak.
+_local = threading.local()
+_all_connections = set()
+_all_connections_lock = threading.Lock()
+_generation = 0  # bumped by close_connections() so threads reopen
+
+
+class _Holder:
+    """Per-thread owner of a connection: collecting it closes the connection."""
+
+    def __init__(self, conn, path, generation):
+        self.conn = conn
+        self.path = path
+        self.generation = generation
+        weakref.finalize(self, _close, conn)
+
+
+def _close(conn):
+    with _all_connections_lock:
+        _all_connections.discard(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _connect():
+    holder = getattr(_local, "holder", None)
+    if holder is not None and holder.path == DB_PATH and holder.generation == _generation:
+        return holder.conn
+
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+        cached_statements=256,
+        check_same_thread=False,  # only used by its own thread; lets close_connections() run anywhere
+    )
+    # WAL: readers no longer block the writer (and vice versa); NORMAL is durable in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+
+    with _all_connections_lock:
+        _all_connections.add(conn)
+    # Replacing a stale holder closes its connection
+    _local.holder = _Holder(conn, DB_PATH, _generation)
+    return conn
+
+
+def close_connections():
+    """Close every open connection (call on shutdown)."""
+    global _generation
+    with _all_connections_lock:
+        _generation += 1
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+# Schema migrations, applied in order on startup. PRAGMA user_version records how
+# many have run; append new entries, never edit or reorder existing ones.
+_MIGRATIONS = [
+    # 1: per-user history reads (WHERE email = ? ORDER BY id DESC LIMIT ?) use an index
+    [
+        "CREATE INDEX IF NOT EXISTS idx_messages_email_id ON messages (email, id)",
+    ],
+]
+
+
+def _migrate(conn):
+    # BEGIN IMMEDIATE takes the write lock first, so concurrent workers starting
+    # up at the same time apply each migration exactly once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version + 1, len(_MIGRATIONS) + 1):
+            for statement in _MIGRATIONS[target - 1]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def schema_version():
+    return _connect().execute("PRAGMA user_version").fetchone()[0]
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -33,54 +133,40 @@ def init_db():
     """)
 
     conn.commit()
-    conn.close()
+    _migrate(conn)
     
-def create_user(email: str, age: int, sex: str, password: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def create_user(email: str, age: int, sex: str, password: str = None, password_hash: str = None):
+    """Pass either `password` (hashed here) or a precomputed `password_hash`."""
+    hashed = password_hash or hash_password(password)
 
-    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-    cursor.execute("""
-        INSERT INTO users (email, age, sex, password_hash, usage_count)
-        VALUES (?, ?, ?, ?, 0)
-    """, (email, age, sex, hashed))
-
-    conn.commit()
-    conn.close()
+    conn = _connect()
+    with conn:
+        conn.execute("""
+            INSERT INTO users (email, age, sex, password_hash, usage_count)
+            VALUES (?, ?, ?, ?, 0)
+        """, (email, age, sex, hashed))
 
 
 
 def get_user(email: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT email, age, sex, password_hash, usage_count FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-
-    conn.close()
-    return row
+    conn = _connect()
+    cursor = conn.execute("SELECT email, age, sex, password_hash, usage_count FROM users WHERE email = ?", (email,))
+    return cursor.fetchone()
 
 
 
 def save_message(email: str, role: str, content: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO messages (email, role, content)
-        VALUES (?, ?, ?);
-    """, (email, role, content))
-
-    conn.commit()
-    conn.close()
+    conn = _connect()
+    with conn:
+        conn.execute("""
+            INSERT INTO messages (email, role, content)
+            VALUES (?, ?, ?);
+        """, (email, role, content))
 
 
 def get_messages(email: str, limit: int = 50):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
+    conn = _connect()
+    cursor = conn.execute("""
         SELECT role, content, timestamp
         FROM messages
         WHERE email = ?
@@ -89,30 +175,41 @@ def get_messages(email: str, limit: int = 50):
     """, (email, limit))
 
     rows = cursor.fetchall()
-    conn.close()
 
     return rows[::-1]
 
 def increment_usage(email):
     print("DEBUG: increment_usage param =", email, type(email))
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "UPDATE users SET usage_count = usage_count + 1 WHERE email = ?",
-        (email,)
-    )
-    conn.commit()
-    conn.close()
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "UPDATE users SET usage_count = usage_count + 1 WHERE email = ?",
+            (email,)
+        )
+
+def apply_writes(usage_increments: dict, messages: list):
+    """
+    Apply a batch in one transaction: {email: n} usage increments and
+    (email, role, content) message rows (used by the write-behind writer).
+    """
+    conn = _connect()
+    with conn:
+        if usage_increments:
+            conn.executemany(
+                "UPDATE users SET usage_count = usage_count + ? WHERE email = ?",
+                [(n, email) for email, n in usage_increments.items()]
+            )
+        if messages:
+            conn.executemany("""
+                INSERT INTO messages (email, role, content)
+                VALUES (?, ?, ?);
+            """, messages)
 
 def get_usage(email):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT usage_count FROM users WHERE email = ?", (email,))
+    conn = _connect()
+    cursor = conn.execute("SELECT usage_count FROM users WHERE email = ?", (email,))
     row = cursor.fetchone()
-    conn.close()
 
     if row and row[0] is not None:
         return int(row[0])
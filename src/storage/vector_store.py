@@ -1,80 +1,407 @@
 import os
+import tempfile
+import threading
+import weakref
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 import json
 import src.utils.config as config
+from src.storage.store_format import is_store_dir, read_store, write_store
+from src.utils.ranking import top_rows
+
+# Rows per block when scoring a non-float32 (e.g. float16 on disk) matrix
+_SCORE_BLOCK_ROWS = 65536
+
+
+def _normalize_rows(matrix):
+    """L2-normalize each row (zero rows are left as zeros)."""
+    matrix = np.asarray(matrix, dtype="float32")
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _dot_rows(matrix, q):
+    """matrix @ q in float32, upcasting compact dtypes block by block (bounded temp memory)."""
+    if matrix.dtype == np.float32:
+        return matrix @ q
+    out = np.empty(len(matrix), dtype="float32")
+    for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+        block = matrix[start:start + _SCORE_BLOCK_ROWS]
+        out[start:start + len(block)] = block.astype("float32") @ q
+    return out
+
+
+def _quantize_rows(matrix, quantization):
+    """
+    Compact copy of `matrix` for scoring: float16, or int8 with one scale per row
+    (row ~= codes * scale). Returns (codes, scales); scales is None for float16.
+    """
+    if quantization == "float16":
+        codes = np.empty(matrix.shape, dtype="float16")
+        for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+            codes[start:start + _SCORE_BLOCK_ROWS] = matrix[start:start + _SCORE_BLOCK_ROWS]
+        return codes, None
+
+    if quantization == "int8":
+        codes = np.empty(matrix.shape, dtype="int8")
+        scales = np.empty(len(matrix), dtype="float32")
+        for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype="float32")
+            block_scales = np.abs(block).max(axis=1) / 127.0
+            block_scales[block_scales == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+            scales[start:start + len(block)] = block_scales
+        return codes, scales
+
+    raise ValueError(f"Unknown quantization: {quantization!r} (expected float16 or int8)")
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 
 class InMemoryVectorStore:
-    def __init__(self):
+    def __init__(self, quantization: str = None, rerank_factor: int = None):
         self.ids = []
         self.texts = []
         self.metadatas = []
+        # Content hash per doc id (None for docs added without one), used by Indexer.sync
+        self.hashes = []
+        # Rows are kept L2-normalized (float32), so cosine similarity is a plain dot product
         self.embeddings = None
-        self._nn = None
+        # Backing array for `embeddings` (may have spare rows for future appends)
+        self._buffer = None
+        # Inverted topic index: topic word -> row ids, full topic phrase -> row ids
+        self._topic_words = {}
+        self._topic_phrases = {}
+        # Optional compact scoring copy ("float16" / "int8"); the top candidates are
+        # re-ranked exactly against `embeddings`. Only the codes stay in RAM: the
+        # full-precision rows are a memory map (the saved store, or a spill file for
+        # stores built in memory), read back just for the few rows re-ranked
+        quantization = quantization or config.VECTOR_STORE_QUANTIZATION
+        self.quantization = None if quantization == "none" else quantization
+        self.rerank_factor = rerank_factor or config.VECTOR_STORE_RERANK_FACTOR
+        self._compact = None  # (codes, scales), built lazily
+        self._compact_lock = threading.Lock()
+        self._spill = None  # finalizer removing a spill file that could not be unlinked while mapped
+        # Bumped on every change, so derived indexes (e.g. BM25) know to refresh
+        self.version = 0
+        self._row_by_id = (None, {})  # (version, id -> row), built on first get()
 
-    def add(self, doc_id: str, text: str, embedding: np.ndarray, metadata: dict = None):
-        self.ids.append(doc_id)
-        self.texts.append(text)
-        self.metadatas.append(metadata or {})
+    def add(self, doc_id: str, text: str, embedding: np.ndarray, metadata: dict = None, content_hash: str = None):
+        self.add_many([doc_id], [text], np.asarray(embedding).reshape(1, -1), [metadata], [content_hash])
 
-        embedding = embedding.reshape(1, -1)
+    def add_many(self, ids, texts, embeddings, metadatas=None, hashes=None):
+        """
+        Bulk append. Rows are copied once into a preallocated buffer that grows
+        geometrically, so repeated appends stay amortized O(n) instead of a vstack per doc.
+        """
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        metadatas = metadatas or [None] * len(ids)
+        hashes = hashes or [None] * len(ids)
+        if not (len(ids) == len(texts) == len(metadatas) == len(hashes) == len(embeddings)):
+            raise ValueError("ids, texts, metadatas, hashes and embeddings must have the same length")
+        if len(ids) == 0:
+            return
 
-        if self.embeddings is None:
-            self.embeddings = embedding
-        else:
-            self.embeddings = np.vstack([self.embeddings, embedding])
+        # Columns loaded from disk are read-only memory maps; copy before mutating
+        if not isinstance(self.texts, list):
+            self.texts = list(self.texts)
+
+        start = len(self.ids)
+        end = start + len(ids)
+        self._reserve(end, embeddings.shape[1])
+        self._buffer[start:end] = embeddings
+        # Normalize in place inside the buffer (no extra copy of the batch)
+        rows = self._buffer[start:end]
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        rows /= norms
+        self.embeddings = self._buffer[:end]
+        self._compact = None
+        self.version += 1
+
+        for row, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas), start):
+            self.ids.append(doc_id)
+            self.texts.append(text)
+            self.metadatas.append(metadata or {})
+            self._index_topics(row, metadata or {})
+        self.hashes.extend(hashes)
+
+    def remove(self, ids):
+        """Drop docs by id, compacting the embedding matrix once."""
+        ids = set(ids)
+        keep = [row for row, doc_id in enumerate(self.ids) if doc_id not in ids]
+        if len(keep) == len(self.ids):
+            return
+
+        self.ids = [self.ids[row] for row in keep]
+        self.texts = [self.texts[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self.hashes = [self.hashes[row] for row in keep]
+        self.embeddings = self.embeddings[keep] if keep else None
+        self._buffer = self.embeddings
+        self._compact = None
+        self.version += 1
+        self._rebuild_topic_index()
+
+    def _reserve(self, n_rows, dim):
+        if self._buffer is not None and self._buffer.shape[1] != dim:
+            raise ValueError(f"Embedding dim {dim} does not match store dim {self._buffer.shape[1]}")
+        capacity = 0 if self._buffer is None else len(self._buffer)
+        if capacity >= n_rows:
+            return
+
+        buffer = np.empty((max(n_rows, capacity + capacity // 2), dim), dtype="float32")
+        n_used = len(self.ids)
+        if n_used:
+            buffer[:n_used] = self.embeddings
+        self._buffer = buffer
+
+    def clear(self):
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.hashes = []
+        self.embeddings = None
+        self._buffer = None
+        self._compact = None
+        self.version += 1
+        self._rebuild_topic_index()
 
-        self._nn = None  # reset index
+    def _index_topics(self, row, metadata):
+        for topic in metadata.get("topics") or []:
+            topic_lower = topic.lower()
+            rows = self._topic_phrases.setdefault(topic_lower, [])
+            if not rows or rows[-1] != row:
+                rows.append(row)
+            for word in set(topic_lower.split()):
+                rows = self._topic_words.setdefault(word, [])
+                if not rows or rows[-1] != row:
+                    rows.append(row)
 
-    def _ensure_index(self):
-        if self._nn is None and self.embeddings is not None and len(self.embeddings) > 0:
-            n_neighbors = min(10, len(self.embeddings))
-            self._nn = NearestNeighbors(n_neighbors=n_neighbors, metric="cosine")
-            self._nn.fit(self.embeddings)
+    def _rebuild_topic_index(self):
+        self._topic_words = {}
+        self._topic_phrases = {}
+        for row, metadata in enumerate(self.metadatas):
+            self._index_topics(row, metadata)
 
-    def query(self, query_embedding, top_k=3):
-        self._ensure_index()
+    def topic_mask(self, query: str):
+        """
+        Boolean row mask of docs whose topics match the query: a full topic
+        phrase appears in the query, OR any topic word is one of the query words.
+        """
+        query_lower = query.lower()
+        mask = np.zeros(len(self.ids), dtype=bool)
 
-        if self._nn is None:
+        for word in set(query_lower.split()):
+            rows = self._topic_words.get(word)
+            if rows:
+                mask[rows] = True
+
+        # Phrase check is a substring test, so it runs over distinct topics (not docs)
+        for phrase, rows in self._topic_phrases.items():
+            if phrase in query_lower:
+                mask[rows] = True
+
+        return mask
+
+    def query(self, query_embedding, top_k=3, mask=None):
+        """
+        Cosine top-k over all rows, or only over rows where `mask` is True (exact, or
+        shortlisted on the quantized copy and re-ranked exactly when quantization is on).
+        Returns dicts with id/text/metadata and `score` = cosine distance (lower is closer).
+        """
+        if self.embeddings is None or len(self.embeddings) == 0:
             return []
 
-        distances, indices = self._nn.kneighbors(
-            query_embedding.reshape(1, -1),
-            n_neighbors=min(top_k, len(self.embeddings))
-        )
+        q = _normalize_rows(query_embedding)[0]
+
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            n_valid = int(mask.sum())
+        else:
+            n_valid = len(self.embeddings)
+
+        k = min(top_k, n_valid)
+        if k <= 0:
+            return []
+
+        if self.quantization:
+            top, sims = self._query_quantized(q, k, mask)
+        else:
+            sims = _dot_rows(self.embeddings, q)
+            if mask is not None:
+                # Masked-out rows can never win
+                sims = np.where(mask, sims, -np.inf)
+            top = top_rows(sims, k)
+            sims = sims[top]
 
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
+        for idx, sim in zip(top, sims):
             results.append({
                 "id": self.ids[idx],
                 "text": self.texts[idx],
                 "metadata": self.metadatas[idx],
-                "score": float(dist),  # cosine distance
+                "score": float(1.0 - sim),  # cosine distance
             })
 
         return results
 
-    def save(self, path=None):
+    def get(self, doc_id):
+        """The stored doc as a result dict (id/text/metadata, no score), or None."""
+        version, row_by_id = self._row_by_id
+        if version != self.version:
+            row_by_id = {stored_id: row for row, stored_id in enumerate(self.ids)}
+            self._row_by_id = (self.version, row_by_id)
+        row = row_by_id.get(doc_id)
+        if row is None:
+            return None
+        return {"id": doc_id, "text": self.texts[row], "metadata": self.metadatas[row]}
+
+    def distances(self, query_embedding, rows):
+        """Exact cosine distance of the query to the given rows."""
+        q = _normalize_rows(query_embedding)[0]
+        rows = np.asarray(rows, dtype="int64")
+        return 1.0 - np.asarray(self.embeddings[rows], dtype="float32") @ q
+
+    def _query_quantized(self, q, k, mask):
+        """Shortlist on the compact codes, then re-rank the shortlist exactly in float32."""
+        compact = self._compact
+        if compact is None:
+            compact = self._build_compact()
+        codes, scales = compact
+
+        approx = _dot_rows(codes, q)
+        if scales is not None:
+            approx *= scales
+        if mask is not None:
+            approx = np.where(mask, approx, -np.inf)
+
+        n_valid = len(approx) if mask is None else int(mask.sum())
+        shortlist = top_rows(approx, min(n_valid, k * self.rerank_factor))
+        shortlist.sort()  # ascending rows = sequential reads from a memory map
+
+        exact = np.asarray(self.embeddings[shortlist], dtype="float32") @ q
+        best = top_rows(exact, k)
+        return shortlist[best], exact[best]
+
+    def _build_compact(self):
+        with self._compact_lock:
+            if self._compact is None:
+                compact = _quantize_rows(self.embeddings, self.quantization)
+                if not isinstance(self.embeddings, np.memmap):
+                    self._spill_embeddings()
+                self._compact = compact
+            return self._compact
+
+    def _spill_embeddings(self):
+        """Move the float32 rows out of RAM into a memory-mapped file on disk (for exact re-ranking)."""
+        # Next to the store by default: the system temp dir is often tmpfs, i.e. RAM again
+        spill_dir = config.VECTOR_STORE_SPILL_DIR or os.path.dirname(config.VECTOR_STORE_PATH)
+        os.makedirs(spill_dir, exist_ok=True)
+        self._release_spill()
+        fd, path = tempfile.mkstemp(prefix="vector_store_", suffix=".f32.spill", dir=spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            np.ascontiguousarray(self.embeddings, dtype="float32").tofile(f)
+        spilled = np.memmap(path, dtype="float32", mode="r", shape=self.embeddings.shape)
+        try:
+            os.remove(path)  # POSIX: the mapping keeps the data; the space is freed with it
+        except OSError:
+            # Open files cannot be removed here: close() (or interpreter exit) removes it
+            self._spill = weakref.finalize(self, _remove_quietly, path)
+        self.embeddings = spilled
+        self._buffer = spilled
+
+    def _release_spill(self):
+        if self._spill is not None:
+            self._spill()
+            self._spill = None
+
+    def close(self):
+        """Empty the store and remove its spill file, if one is still on disk."""
+        self.clear()
+        self._release_spill()
+
+    def save(self, path=None, dtype=None):
+        """
+        Save to `path`: a directory in the memory-mappable format (default), or a
+        legacy pickled .npz when the path ends with ".npz".
+        """
         path = path or config.VECTOR_STORE_PATH
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
+        if not path.endswith(".npz"):
+            write_store(
+                path,
+                self.ids,
+                self.texts,
+                self.metadatas,
+                self.hashes,
+                self.embeddings,
+                dtype=dtype or config.VECTOR_STORE_DTYPE,
+            )
+            return
+
         np.savez(
             path,
             embeddings=self.embeddings.astype("float32") if self.embeddings is not None else np.empty((0,)),
             ids=np.array(self.ids, dtype=object),
             texts=np.array(self.texts, dtype=object),
-            metadatas=np.array(self.metadatas, dtype=object)
+            metadatas=np.array(self.metadatas, dtype=object),
+            hashes=np.array(self.hashes, dtype=object)
         )
 
     def load(self, path=None):
-        path = path or config.VECTOR_STORE_PATH
-        if not os.path.exists(path):
-            return
+        """
+        Load from `path` (format auto-detected). Without a path, the default store
+        is used, falling back to the legacy .npz. Returns True if something was loaded.
+        """
+        path = path or resolve_store_path()
+        if not path or not os.path.exists(path):
+            return False
+
+        if is_store_dir(path):
+            data = read_store(path)
+            # Saved rows are already normalized: keep the read-only memory map as is
+            self.embeddings = data["embeddings"]
+            self._buffer = self.embeddings
+            self._compact = None
+            self.ids = data["ids"]
+            self.texts = data["texts"]
+            self.metadatas = data["metadatas"]
+            self.hashes = data["hashes"]
+            self.version += 1
+            self._rebuild_topic_index()
+            return True
 
         data = np.load(path, allow_pickle=True)
 
-        self.embeddings = data["embeddings"]
+        embeddings = data["embeddings"]
+        # Normalize once at load time instead of on every query
+        self.embeddings = _normalize_rows(embeddings) if embeddings.size else None
+        self._buffer = self.embeddings
+        self._compact = None
         self.ids = data["ids"].tolist()
         self.texts = data["texts"].tolist()
         self.metadatas = data["metadatas"].tolist()
-        self._nn = None
+        # Stores written before content hashing have no hashes: the next sync re-embeds them once
+        self.hashes = data["hashes"].tolist() if "hashes" in data.files else [None] * len(self.ids)
+        self.version += 1
+        self._rebuild_topic_index()
+        return True
+
+
+def resolve_store_path():
+    """The default store to load: the memory-mapped store, else the legacy .npz, else None."""
+    for path in (config.VECTOR_STORE_PATH, config.LEGACY_VECTOR_STORE_PATH):
+        if path and os.path.exists(path):
+            return path
+    return None
@@ -0,0 +1,129 @@
+import threading
+
+import src.utils.config as config
+from src.storage import user_db
+
+
+class WriteBehindWriter:
+    """
+    Buffers usage increments and message inserts off the request path and writes
+    them in one transaction every `flush_interval_ms`, or sooner once
+    `max_pending` writes are queued. Increments for the same user are coalesced.
+
+    get_usage() adds not-yet-flushed increments to the stored count, so a user
+    always sees their own writes. Call close() on shutdown to flush the rest.
+
+    A failed batch is re-queued; after `max_retries` failures in a row it is
+    written row by row and the rows that still fail are logged and dropped.
+    """
+
+    def __init__(self, flush_interval_ms: float = None, max_pending: int = None, max_retries: int = None):
+        self.flush_interval = (flush_interval_ms or config.WRITE_BEHIND_FLUSH_MS) / 1000.0
+        self.max_pending = max_pending or config.WRITE_BEHIND_MAX_PENDING
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time
+        # Odd while a batch is being written: readers wait for it to land, and a
+        # change across a reader's DB read means it must read again
+        self._generation = 0
+        self._flushed = threading.Condition(self._lock)
+        self._usage = {}
+        self._messages = []
+        self._n_pending = 0
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.max_retries = config.WRITE_BEHIND_MAX_RETRIES if max_retries is None else max_retries
+        self._failures = 0  # consecutive failed flushes of the re-queued batch
+        self.flushes = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def increment_usage(self, email: str, n: int = 1):
+        with self._lock:
+            self._usage[email] = self._usage.get(email, 0) + n
+            self._queued()
+
+    def save_message(self, email: str, role: str, content: str):
+        with self._lock:
+            self._messages.append((email, role, content))
+            self._queued()
+
+    def _queued(self):
+        self._n_pending += 1
+        if self._n_pending >= self.max_pending:
+            self._wakeup.set()
+
+    def get_usage(self, email: str):
+        """Stored usage plus pending increments; None if the user does not exist."""
+        while True:
+            with self._flushed:
+                while self._generation % 2:
+                    self._flushed.wait()
+                generation = self._generation
+                pending = self._usage.get(email, 0)
+            # Read outside the locks; retry if a batch was written meanwhile
+            row = user_db.get_user(email)
+            with self._lock:
+                if self._generation == generation:
+                    break
+        if not row:
+            return None
+        return int(row[4] or 0) + pending
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                usage, self._usage = self._usage, {}
+                messages, self._messages = self._messages, []
+                self._n_pending = 0
+                if not usage and not messages:
+                    return
+                self._generation += 1
+
+            failed = False
+            try:
+                user_db.apply_writes(usage, messages)
+                self.flushes += 1
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                if self._failures <= self.max_retries:
+                    print(f"❌ Write-behind flush failed, will retry: {e}")
+                    failed = True
+                else:
+                    print(f"❌ Write-behind flush failed {self._failures} times, writing rows one by one: {e}")
+                    self._apply_rows(usage, messages)
+                    self._failures = 0
+
+            with self._flushed:
+                if failed:
+                    for email, n in usage.items():
+                        self._usage[email] = self._usage.get(email, 0) + n
+                    self._messages[:0] = messages
+                    self._n_pending += len(usage) + len(messages)
+                self._generation += 1
+                self._flushed.notify_all()
+
+    def _apply_rows(self, usage, messages):
+        """Write each row on its own; rows that still fail are logged and dropped so later writes go through."""
+        rows = [({email: n}, []) for email, n in usage.items()] + [({}, [msg]) for msg in messages]
+        for row_usage, row_messages in rows:
+            try:
+                user_db.apply_writes(row_usage, row_messages)
+            except Exception as e:
+                self.dropped += 1
+                print(f"❌ Write-behind dropped {row_usage or row_messages[0][:2]}: {e}")
+        self.flushes += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._wakeup.set()
+            self._thread.join()
+        self.flush()
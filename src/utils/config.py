@@ -16,7 +16,49 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL")
 
+# Prompt size: total input-token budget, share for chat history, smallest context
+# excerpt worth sending (token counts are estimated at ~CHARS_PER_TOKEN chars/token)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1000"))
+PROMPT_MIN_SECTION_TOKENS = int(os.getenv("PROMPT_MIN_SECTION_TOKENS", "40"))
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+
+# Opt-in semantic response cache for first messages of a conversation
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+
+# Shared Groq HTTP connection pool (keep-alive avoids a TLS handshake per chat)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+# Texts per SentenceTransformer.encode call when indexing documents
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Sections per vector-store append when indexing a (streamed) corpus
+INDEX_BATCH_SECTIONS = int(os.getenv("INDEX_BATCH_SECTIONS", "1024"))
+# Query embedding LRU (0 disables); set QUERY_CACHE_DIR to persist it across restarts
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR") or None
+# Micro-batching of concurrent query encodes: wait up to N ms / N items (0 ms disables)
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+
+# -------------------------------
+# 🔐 PASSWORDS / SESSIONS
+# -------------------------------
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(60 * 60)))
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+# /chat rejects requests without a session token (else the token is opt-in: checked when sent)
+REQUIRE_SESSION_TOKEN = os.getenv("REQUIRE_SESSION_TOKEN", "false").lower() in ("1", "true", "yes")
+
 
 # -------------------------------
 # 🗂 ROOT DATA DIR (contains docs)
@@ -25,6 +67,10 @@ DATA_DIR = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "..", "data")
 )
 
+# Without SESSION_SECRET, a secret is generated into this file the first time a
+# token is signed (src/utils/security.py), so every worker and restart shares it
+SESSION_SECRET_PATH = os.getenv("SESSION_SECRET_PATH", os.path.join(DATA_DIR, ".session_secret"))
+
 # -------------------------------
 # 📄 DOCS DIR (this must exist)
 # -------------------------------
@@ -33,15 +79,85 @@ DOCS_DIR = os.path.join(DATA_DIR, "docs")
 # -------------------------------
 # 💾 VECTOR STORE SAVED IN src/data
 # -------------------------------
+# Memory-mapped store directory (see src/storage/store_format.py)
 VECTOR_STORE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "vector_store")
+)
+# Older pickled .npz store, still loaded when the directory store is missing
+LEGACY_VECTOR_STORE_PATH = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "data", "vector_store.index.npz")
 )
+# On-disk embedding dtype: float32 or float16
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+# In-memory scoring copy: none, float16 or int8 (shortlist of top_k * RERANK_FACTOR re-ranked exactly)
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+VECTOR_STORE_RERANK_FACTOR = int(os.getenv("VECTOR_STORE_RERANK_FACTOR", "4"))
+# Where a quantized in-memory store spills its float32 rows (default: next to VECTOR_STORE_PATH)
+VECTOR_STORE_SPILL_DIR = os.getenv("VECTOR_STORE_SPILL_DIR") or None
+# Sharded store (src/storage/sharded_vector_store.py): >1 shards enables it; docs are
+# partitioned by first topic ("topic", lets topic filtering skip shards) or id ("hash");
+# shards are searched on SHARD_SEARCH_THREADS threads (0 = min(shards, cores))
+VECTOR_STORE_SHARDS = int(os.getenv("VECTOR_STORE_SHARDS", "1"))
+VECTOR_STORE_PARTITION = os.getenv("VECTOR_STORE_PARTITION", "topic")
+SHARD_SEARCH_THREADS = int(os.getenv("SHARD_SEARCH_THREADS", "0"))
+SHARDED_VECTOR_STORE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "vector_store_sharded")
+)
+
+# Sections longer than CHUNK_MAX_TOKENS are split into sentence-aligned chunks
+# (0 disables) overlapping by CHUNK_OVERLAP_TOKENS; retrieved chunks are widened
+# by CHUNK_EXPAND_WINDOW neighbouring chunks of the same section on each side
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+CHUNK_EXPAND_WINDOW = int(os.getenv("CHUNK_EXPAND_WINDOW", "1"))
+
+# Streaming doc loader: parser processes (0 = one per core, at most
+# LOADER_MAX_DEFAULT_WORKERS) and files per pool task
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "0"))
+LOADER_MAX_DEFAULT_WORKERS = int(os.getenv("LOADER_MAX_DEFAULT_WORKERS", "4"))
+LOADER_FILES_PER_TASK = int(os.getenv("LOADER_FILES_PER_TASK", "64"))
+
+# Retrieval: "topic" (hard topic filter + cosine) or "hybrid" (BM25 + dense, rank fusion)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "topic")
+# Sparse BM25 index, kept next to the vector store (rebuilt when the store changes)
+BM25_INDEX_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "bm25_index")
+)
+# Candidates taken from each ranking before fusion; RRF constant (score = 1 / (k + rank))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
 
 CHAT_HISTORY_PATH = os.path.join(DATA_DIR, "chat_history.json")
 
+# SQLite (user_db): wait this long on a locked DB; WAL-mode synchronous level
+SQLITE_BUSY_TIMEOUT_MS = float(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+# Write-behind batching of usage counters / message inserts (flush every N ms or N writes)
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "256"))
+# Failed flushes of a batch before it is written row by row (failing rows are dropped)
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+
+# Threads for awaitable storage calls (src/storage/io_executor.py)
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "4"))
+
+# Free chats per user, checked against users.usage_count before each /chat. Off by
+# default: the limit was never enforced before, and turning it on locks out every
+# existing user at or over it
+ENFORCE_FREE_CHAT_LIMIT = os.getenv("ENFORCE_FREE_CHAT_LIMIT", "false").lower() in ("1", "true", "yes")
+FREE_CHAT_LIMIT = int(os.getenv("FREE_CHAT_LIMIT", "50"))
+
 # --------------------------------------------------------
 # ✅ NEW: Chat history folder for per-user chat storage
 # (You requested: "keep code intact and add additional code with comments")
 # --------------------------------------------------------
 CHAT_HISTORY_DIR = os.path.join(DATA_DIR, "chat_history")
 os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)   # ensure folder exists
+# Recent messages kept in memory per ChatHistory (older ones are read from the file tail)
+CHAT_HISTORY_TAIL = int(os.getenv("CHAT_HISTORY_TAIL", "50"))
+# Loaded ChatHistory objects kept per process (LRU size, idle seconds before reload)
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1024"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "900"))
+# fsync every appended message (durable across power loss, slower)
+CHAT_HISTORY_FSYNC = os.getenv("CHAT_HISTORY_FSYNC", "0") == "1"
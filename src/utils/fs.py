@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: file_lock() does not lock
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path, blocking: bool = True):
+    """
+    Exclusive lock on the file `lock_path`, across processes. Yields True while
+    held; with blocking=False it yields False at once if another process holds it.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(lock_path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_dir(path):
+    """
+    Yields a fresh temp directory next to `path`; when the block succeeds it
+    replaces `path` (old one renamed aside, new one renamed in, old removed).
+    Each writer has its own temp dir and swaps are serialized by a lock file,
+    so concurrent writers (e.g. several server workers) never clobber each other:
+    the last one to finish wins. On error the temp dir is removed.
+    """
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=parent)
+    os.chmod(tmp_path, 0o755)
+    try:
+        yield tmp_path
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    old_path = f"{path}.old-{uuid.uuid4().hex}"
+    with file_lock(f"{path}.lock"):
+        try:
+            os.replace(path, old_path)
+        except FileNotFoundError:
+            old_path = None
+        os.replace(tmp_path, path)
+    if old_path:
+        shutil.rmtree(old_path, ignore_errors=True)
@@ -0,0 +1,10 @@
+import numpy as np
+
+
+def top_rows(scores, k):
+    """Indices of the k highest scores, best first (argpartition, then a stable sort of just those k)."""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import src.utils.config as config
+
+# bcrypt is deliberately slow (~100-300 ms): run it on a small dedicated pool so it
+# never blocks the event loop or competes with chat work for the default threadpool
+_PASSWORD_EXECUTOR = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)).decode()
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    if not stored_hash:
+        return False
+    return bcrypt.checkpw(password.encode(), stored_hash.encode())
+
+
+async def ahash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_PASSWORD_EXECUTOR, hash_password, password)
+
+
+async def averify_password(password: str, stored_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_PASSWORD_EXECUTOR, verify_password, password, stored_hash)
+
+
+# --------------------------------------------------------
+# Session tokens: base64url(JSON payload) + "." + base64url(HMAC-SHA256)
+# --------------------------------------------------------
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+_generated_secrets = {}  # SESSION_SECRET_PATH -> secret read from / written to it
+_secret_lock = threading.Lock()
+
+
+def _load_or_create_secret(path):
+    """The secret stored at `path`; the first caller creates it (atomically, so concurrent workers agree)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp_path, path)  # fails if another worker got there first
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _session_secret() -> str:
+    """SESSION_SECRET, else the shared generated one (created on first use, not at import)."""
+    if config.SESSION_SECRET:
+        return config.SESSION_SECRET
+    path = config.SESSION_SECRET_PATH
+    with _secret_lock:
+        if path not in _generated_secrets:
+            print(f"⚠️ SESSION_SECRET not set — using the secret stored in {path}")
+            _generated_secrets[path] = _load_or_create_secret(path)
+        return _generated_secrets[path]
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_session_secret().encode(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def create_session_token(email: str, ttl: int = None) -> str:
+    payload = _b64encode(json.dumps({
+        "sub": email,
+        "exp": int(time.time()) + (ttl if ttl is not None else config.SESSION_TTL_SECONDS),
+    }).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_session_token(token: str):
+    """Returns the token's email if the signature is valid and it has not expired, else None."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        data = json.loads(_b64decode(payload))
+    except (ValueError, AttributeError):
+        return None
+
+    if data.get("exp", 0) < time.time():
+        return None
+    return data.get("sub")
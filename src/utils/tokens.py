@@ -0,0 +1,25 @@
+import math
+
+import src.utils.config as config
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimated token count (~CHARS_PER_TOKEN characters per token for English
+    text with Llama-style tokenizers). O(1): no tokenizer runs per request.
+    """
+    return math.ceil(len(text) / config.CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """`text` cut to about `max_tokens`, at a sentence or word boundary when there is one."""
+    max_chars = int(max_tokens * config.CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Prefer ending on a full sentence in the last half, else on a word
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1].rstrip()
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut).rstrip()
@@ -0,0 +1,103 @@
+import json
+import src.utils.config as config
+from src.storage.chat_history import ChatHistory
+
+
+def _use_tmp_dir(tmp_path, monkeypatch, tail=4):
+    monkeypatch.setattr(config, "CHAT_HISTORY_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "CHAT_HISTORY_TAIL", tail)
+
+
+def test_messages_are_appended_and_served_from_tail(tmp_path, monkeypatch):
+    _use_tmp_dir(tmp_path, monkeypatch)
+    history = ChatHistory("a@example.com")
+    for i in range(5):
+        history.add_user(f"q{i}")
+        history.add_assistant(f"a{i}")
+
+    lines = (tmp_path / "a@example.com.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 10 and json.loads(lines[0])["content"] == "q0"
+
+    reopened = ChatHistory("a@example.com")
+    assert [m["content"] for m in reopened.last_n(3)] == ["a3", "q4", "a4"]
+    # Beyond the in-memory tail, last_n reads backwards from the file
+    assert [m["content"] for m in reopened.last_n(7)] == ["a1", "q2", "a2", "q3", "a3", "q4", "a4"]
+    assert reopened.last_n(6) == history.last_n(6)
+
+
+def test_legacy_json_is_migrated(tmp_path, monkeypatch):
+    _use_tmp_dir(tmp_path, monkeypatch)
+    legacy = [{"role": "user", "text": "old question"}, {"role": "assistant", "content": "old answer"}]
+    (tmp_path / "b@example.com.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    history = ChatHistory("b@example.com")
+    assert history.last_n(6) == [
+        {"role": "user", "content": "old question"},
+        {"role": "assistant", "content": "old answer"},
+    ]
+    assert not (tmp_path / "b@example.com.json").exists()
+
+
+def test_torn_write_is_skipped_and_compacted(tmp_path, monkeypatch):
+    _use_tmp_dir(tmp_path, monkeypatch)
+    path = tmp_path / "c@example.com.jsonl"
+    path.write_text('{"role": "user", "content": "hi"}\n{"role": "assis', encoding="utf-8")
+
+    history = ChatHistory("c@example.com")
+    history.add_assistant("hello")
+    assert [m["content"] for m in history.last_n(6)] == ["hi", "hello"]
+    assert [m["content"] for m in ChatHistory("c@example.com").last_n(6)] == ["hi", "hello"]
+
+    history.compact(keep_last=1)
+    assert path.read_text(encoding="utf-8").count("\n") == 1
+    assert [m["content"] for m in ChatHistory("c@example.com").last_n(6)] == ["hello"]
+
+
+def test_history_cache_shares_one_instance_per_user(tmp_path, monkeypatch):
+    import threading
+    from src.storage.history_cache import ChatHistoryCache
+    _use_tmp_dir(tmp_path, monkeypatch, tail=100)
+    cache = ChatHistoryCache(max_size=2, ttl=60)
+
+    seen = []
+    def worker(i):
+        history = cache.get("a@example.com")
+        seen.append(history)
+        history.add_user(f"q{i}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(h) for h in seen}) == 1
+    assert sorted(m["content"] for m in cache.get("a@example.com").last_n(8)) == [f"q{i}" for i in range(8)]
+
+    # Eviction loses nothing: histories are written through to disk
+    cache.get("b@example.com")
+    cache.get("c@example.com")
+    reloaded = cache.get("a@example.com")
+    assert reloaded is not seen[0]
+    assert len(reloaded.last_n(8)) == 8
+    assert cache.stats()["size"] == 2
+
+
+def test_history_cache_reloads_when_another_worker_appends(tmp_path, monkeypatch):
+    from src.storage.history_cache import ChatHistoryCache
+    _use_tmp_dir(tmp_path, monkeypatch, tail=100)
+    cache = ChatHistoryCache(max_size=2, ttl=60)
+    cached = cache.get("a@example.com")
+    cached.add_user("q1")
+    assert not cached.is_stale()  # our own writes do not force a reload
+
+    other_worker = ChatHistory("a@example.com")
+    other_worker.add_assistant("a1")
+    other_worker.add_user("q2")
+
+    history = cache.get("a@example.com")
+    assert history is cached
+    assert [m["content"] for m in history.last_n(6)] == ["q1", "a1", "q2"]
+
+    history.add_assistant("a2")
+    assert [m["content"] for m in ChatHistory("a@example.com").last_n(6)] == ["q1", "a1", "q2", "a2"]
@@ -0,0 +1,96 @@
+import types
+import numpy as np
+import src.utils.config as config
+from src.rag.doc_loader import chunk_documents, iter_text_documents, load_text_documents
+from src.rag.retriever import expand_neighbours
+from src.storage.vector_store import InMemoryVectorStore
+from src.utils.tokens import count_tokens
+
+SENTENCES = [f"Sentence number {i} talks about calm breathing." for i in range(40)]
+
+
+def _write_doc(tmp_path):
+    (tmp_path / "stress.txt").write_text(
+        "Topic1: stress, anxiety\nShort tip: breathe slowly.\n"
+        "Topic2: sleep\n" + " ".join(SENTENCES) + "\n",
+        encoding="utf-8",
+    )
+
+
+def test_long_sections_become_bounded_overlapping_chunks(tmp_path):
+    _write_doc(tmp_path)
+    docs = load_text_documents(str(tmp_path), max_tokens=60, overlap_tokens=15)
+
+    assert docs[0] == {
+        "id": "stress.txt#section1",
+        "text": "Short tip: breathe slowly.",
+        "metadata": {"source": "stress.txt", "topics": ["stress", "anxiety"]},
+    }
+
+    chunks = docs[1:]
+    assert [c["id"] for c in chunks] == [f"stress.txt#section2#chunk{i+1}" for i in range(len(chunks))]
+    assert len(chunks) > 1
+    for i, chunk in enumerate(chunks):
+        meta = chunk["metadata"]
+        assert meta["source"] == "stress.txt" and meta["topics"] == ["sleep"]
+        assert (meta["parent_id"], meta["chunk_index"], meta["n_chunks"]) == ("stress.txt#section2", i, len(chunks))
+        assert count_tokens(chunk["text"]) <= 60
+        assert chunk["text"].endswith(".")  # sentence-aligned
+    assert chunks[0]["metadata"]["overlap"] == 0
+    assert all(c["metadata"]["overlap"] > 0 for c in chunks[1:])
+
+    # Dropping each chunk's overlap gives back every sentence exactly once
+    rebuilt = " ".join(c["text"][c["metadata"]["overlap"]:].strip() for c in chunks)
+    assert rebuilt == " ".join(SENTENCES)
+
+    # Same input, same ids
+    assert [c["id"] for c in load_text_documents(str(tmp_path), max_tokens=60, overlap_tokens=15)] == [d["id"] for d in docs]
+
+
+def test_oversized_sentence_is_split_on_words():
+    doc = {"id": "a", "text": "word " * 200, "metadata": {}}
+    chunks = chunk_documents([doc], max_tokens=50, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(count_tokens(c["text"]) <= 50 for c in chunks)
+
+
+def test_chunking_disabled():
+    doc = {"id": "a", "text": "x. " * 500, "metadata": {}}
+    assert chunk_documents([doc], max_tokens=0) == [doc]
+
+
+def test_expand_neighbours_merges_adjacent_chunks(tmp_path):
+    _write_doc(tmp_path)
+    docs = load_text_documents(str(tmp_path), max_tokens=60, overlap_tokens=15)
+    store = InMemoryVectorStore()
+    store.add_many([d["id"] for d in docs], [d["text"] for d in docs], np.ones((len(docs), 2)), [d["metadata"] for d in docs])
+
+    chunks = docs[1:]
+    results = [dict(chunks[2], score=0.1), dict(chunks[3], score=0.2), dict(docs[0], score=0.3)]
+    expanded = expand_neighbours(results, store, window=1)
+
+    # chunk 3 is already inside chunk 2's window, so it is not sent twice
+    assert [d["id"] for d in expanded] == [chunks[2]["id"], docs[0]["id"]]
+    text = expanded[0]["text"]
+    assert text.startswith(chunks[1]["text"])
+    for chunk in chunks[1:4]:
+        assert chunk["text"] in text.replace("\n", " ")
+    assert expanded[0]["score"] == 0.1
+    assert expanded[1] is results[2]
+
+
+def test_streaming_loader_matches_list_loader(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LOADER_FILES_PER_TASK", 2)
+    for i in range(7):
+        (tmp_path / f"doc{i}.txt").write_text(f"Topic1: t{i}\nfirst {i}\nTopic2: u{i}\nsecond {i}\n\n", encoding="utf-8")
+    (tmp_path / "plain.txt").write_text("\nno headers here\n\n", encoding="utf-8")
+    (tmp_path / "notes.md").write_text("Topic1: skipped", encoding="utf-8")
+
+    stream = iter_text_documents(str(tmp_path), workers=3)
+    assert isinstance(stream, types.GeneratorType)
+    docs = list(stream)
+
+    assert docs == load_text_documents(str(tmp_path))
+    assert docs == list(iter_text_documents(str(tmp_path), workers=1))
+    assert len(docs) == 15
+    assert {"id": "plain.txt", "text": "no headers here", "metadata": {"source": "plain.txt", "topics": ["plain"]}} in docs
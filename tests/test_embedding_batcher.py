@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+import pytest
+from src.rag.embedding_batcher import MicroBatcher
+
+
+def test_concurrent_texts_share_one_encode_call():
+    calls = []
+    gate = threading.Barrier(8)
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts])
+
+    batcher = MicroBatcher(encode, window_ms=200, max_batch=8)
+    results = {}
+
+    def worker(i):
+        gate.wait()
+        results[i] = batcher.embed("x" * i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert len(calls) == 1 and len(calls[0]) == 8
+    for i, vector in results.items():
+        assert vector[0] == i
+
+
+def test_encode_errors_propagate_to_callers():
+    def encode(texts):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(encode, window_ms=1)
+    with pytest.raises(RuntimeError, match="model exploded"):
+        batcher.embed("hi")
+    batcher.close()
+
+
+def test_close_racing_submit_never_leaves_a_caller_hanging():
+    batcher = MicroBatcher(lambda texts: np.ones((len(texts), 2)), window_ms=1)
+    futures, refused = [], []
+    start = threading.Barrier(5)
+
+    def worker():
+        start.wait()
+        for _ in range(200):
+            try:
+                futures.append(batcher.submit("hi"))
+            except RuntimeError:
+                refused.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    start.wait()
+    batcher.close()
+    for t in threads:
+        t.join()
+
+    for future in futures:
+        assert future.result(timeout=5)[0] == 1.0  # accepted before close: encoded
+    assert len(futures) + len(refused) == 800
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit("late")
@@ -0,0 +1,45 @@
+import threading
+import numpy as np
+from src.rag.embedding_cache import EmbeddingCache
+
+
+def test_lru_eviction_and_counters():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("m", "hi", np.array([1.0, 0.0]))
+    cache.put("m", "help", np.array([0.0, 1.0]))
+    assert np.allclose(cache.get("m", "  hi "), [1.0, 0.0])  # whitespace-normalized key
+    cache.put("m", "i feel anxious", np.array([1.0, 1.0]))  # evicts "help" (least recent)
+
+    assert cache.get("m", "help") is None
+    assert cache.get("other-model", "hi") is None
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 1, "disk_hits": 0, "misses": 2}
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    EmbeddingCache(max_size=4, cache_dir=str(tmp_path)).put("m", "hi", np.array([0.5, 0.5]))
+
+    cache = EmbeddingCache(max_size=4, cache_dir=str(tmp_path))
+    assert np.allclose(cache.get("m", "hi"), [0.5, 0.5])
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("m", "hi") is not None
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_access():
+    cache = EmbeddingCache(max_size=8)
+
+    def worker(i):
+        for j in range(200):
+            text = f"q{(i + j) % 16}"
+            if cache.get("m", text) is None:
+                cache.put("m", text, np.full(3, (i + j) % 16, dtype="float32"))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert stats["size"] <= 8
+    assert stats["hits"] + stats["misses"] == 8 * 200
@@ -0,0 +1,105 @@
+import numpy as np
+from src.rag import bm25
+from src.rag.retriever import HybridRetriever, Retriever
+from src.storage.vector_store import InMemoryVectorStore
+
+
+class FakeEmbedder:
+    """Bag of words over a tiny fixed vocabulary."""
+    VOCAB = ["sleep", "stress", "breathe", "friend", "panic"]
+
+    def embed_query(self, text):
+        words = bm25.tokenize(text)
+        return np.array([words.count(w) for w in self.VOCAB], dtype="float32") + 0.01
+
+
+def _store():
+    store = InMemoryVectorStore()
+    docs = [
+        ("s1", "keep a regular sleep schedule", ["sleep"]),
+        ("s2", "breathe slowly when stress builds", ["stress"]),
+        ("s3", "call a friend and talk it through", ["loneliness"]),
+        ("s4", "grounding exercise for a panic attack: name five things you can see", ["anxiety"]),
+    ]
+    embedder = FakeEmbedder()
+    for doc_id, text, topics in docs:
+        store.add(doc_id, text, embedder.embed_query(text), {"topics": topics})
+    return store
+
+
+def test_bm25_scores_match_reference():
+    texts = ["a b b", "b c", "c c c d"]
+    index = bm25.BM25Index(k1=1.2, b=0.75).build(texts)
+
+    avg_len = 3.0
+    n = len(texts)
+    df = {"b": 2, "c": 2}
+    expected = []
+    for text in texts:
+        tokens = text.split()
+        score = 0.0
+        for term in ("b", "c"):
+            tf = tokens.count(term)
+            idf = np.log1p((n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(tokens) / avg_len))
+        expected.append(score)
+
+    assert np.allclose(index.scores("b c unknown"), expected, atol=1e-5)
+    rows, _ = index.top("d", 5)
+    assert rows.tolist() == [2]
+
+
+def test_hybrid_finds_sections_without_a_topic_match(tmp_path):
+    store = _store()
+    query = "what helps with a panic attack"
+    assert Retriever(FakeEmbedder(), store).retrieve(query) == []
+    assert not Retriever(FakeEmbedder(), store).may_match(query)
+    assert Retriever(FakeEmbedder(), store).may_match("cannot sleep")
+
+    hybrid = HybridRetriever(FakeEmbedder(), store, index_path=str(tmp_path / "bm25"))
+    assert hybrid.may_match(query)
+    results = hybrid.retrieve(query, top_k=2)
+    assert results[0]["id"] == "s4"
+    assert len(results) == 2
+    assert results[0]["rrf"] >= results[1]["rrf"]
+    assert abs(results[0]["score"] - store.distances(FakeEmbedder().embed_query(query), [3])[0]) < 1e-5
+
+
+def test_index_is_saved_and_rebuilt_when_store_changes(tmp_path):
+    path = str(tmp_path / "bm25")
+    store = _store()
+    retriever = HybridRetriever(FakeEmbedder(), store, index_path=path)
+    fingerprint = retriever.bm25().fingerprint
+    assert bm25.BM25Index.load(path).fingerprint == fingerprint
+
+    # A fresh process reuses the saved index
+    assert bm25.load_or_build(store, path).n_docs == 4
+
+    store.add("s5", "journaling before bed", FakeEmbedder().embed_query("sleep"), {"topics": ["journaling"]})
+    assert retriever.retrieve("journaling", top_k=1)[0]["id"] == "s5"
+    assert bm25.BM25Index.load(path).fingerprint != fingerprint
+
+
+def test_workers_building_the_index_at_once_do_not_clobber_it(tmp_path):
+    import os
+    import threading
+    path = str(tmp_path / "bm25")
+    store = _store()
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(5):
+                bm25.BM25Index().build(list(store.texts), "fp").save(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert bm25.BM25Index.load(path).n_docs == 4
+    assert sorted(os.listdir(tmp_path)) == ["bm25", "bm25.lock"]
@@ -0,0 +1,93 @@
+import numpy as np
+import src.utils.config as config
+from src.rag.indexer import Indexer
+from src.storage.vector_store import InMemoryVectorStore
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, batch_size=None):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count("a") + 1.0] for t in texts], dtype="float32")
+
+
+def test_index_documents_embeds_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", str(tmp_path / "store.npz"))
+    embedder = FakeEmbedder()
+    store = InMemoryVectorStore()
+    docs = [{"id": f"d{i}", "text": "a" * (i + 1), "metadata": {"topics": ["t"]}} for i in range(5)]
+
+    Indexer(embedder, store, batch_size=2).index_documents(docs)
+
+    assert [len(c) for c in embedder.calls] == [2, 2, 1]
+    assert store.ids == [f"d{i}" for i in range(5)]
+    assert store.embeddings.shape == (5, 2)
+    assert (tmp_path / "store.npz").exists()
+
+
+def test_sync_only_embeds_new_or_changed_sections(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", str(tmp_path / "store.npz"))
+    embedder = FakeEmbedder()
+    store = InMemoryVectorStore()
+    indexer = Indexer(embedder, store)
+    docs = [
+        {"id": "a.txt#section1", "text": "breathe slowly", "metadata": {"source": "a.txt", "topics": ["stress"]}},
+        {"id": "a.txt#section2", "text": "sleep routine", "metadata": {"source": "a.txt", "topics": ["sleep"]}},
+        {"id": "b.txt", "text": "talk to a friend", "metadata": {"source": "b.txt", "topics": ["b"]}},
+    ]
+    assert indexer.sync(docs) == {"added": 3, "updated": 0, "removed": 0, "unchanged": 0}
+
+    embedder.calls.clear()
+    edited = [dict(docs[0], text="breathe slowly and count"), docs[1]]
+    assert indexer.sync(edited) == {"added": 0, "updated": 1, "removed": 1, "unchanged": 1}
+    assert embedder.calls == [["breathe slowly and count"]]
+    assert sorted(store.ids) == ["a.txt#section1", "a.txt#section2"]
+    assert store.embeddings.shape == (2, 2)
+
+    reloaded = InMemoryVectorStore()
+    reloaded.load()
+    embedder.calls.clear()
+    assert Indexer(embedder, reloaded).sync(edited)["unchanged"] == 2
+    assert embedder.calls == []
+
+
+def test_index_documents_consumes_a_stream_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", str(tmp_path / "store"))
+    embedder = FakeEmbedder()
+    store = InMemoryVectorStore()
+    consumed = []
+
+    def stream():
+        for i in range(5):
+            consumed.append(len(embedder.calls))
+            yield {"id": f"d{i}", "text": "a" * (i + 1), "metadata": {"topics": ["t"]}}
+
+    n = Indexer(embedder, store, batch_size=8).index_documents(stream(), batch_sections=2)
+
+    assert n == 5
+    # Each batch is embedded before the next docs are pulled from the stream
+    assert consumed == [0, 0, 1, 1, 2]
+    assert [len(c) for c in embedder.calls] == [2, 2, 1]
+    assert store.ids == [f"d{i}" for i in range(5)]
+    assert store.metadatas[0] == {"topics": ["t"], "n_tokens": 1}
+
+
+def test_sync_backfills_token_counts_of_older_stores(tmp_path, monkeypatch):
+    from src.rag.indexer import content_hash
+    from src.utils.tokens import count_tokens
+    monkeypatch.setattr(config, "VECTOR_STORE_PATH", str(tmp_path / "store"))
+    embedder = FakeEmbedder()
+    doc = {"id": "a", "text": "breathe slowly", "metadata": {"topics": ["stress"]}}
+    store = InMemoryVectorStore()
+    # Indexed before n_tokens was stored with each section
+    store.add_many(["a"], [doc["text"]], embedder.embed([doc["text"]]), [{"topics": ["stress"]}], [content_hash(doc)])
+
+    assert Indexer(embedder, store).sync([doc])["unchanged"] == 1
+    assert store.metadatas[0]["n_tokens"] == count_tokens("breathe slowly")
+    reloaded = InMemoryVectorStore()
+    reloaded.load()
+    assert reloaded.metadatas[0]["n_tokens"] == count_tokens("breathe slowly")
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import threading
+import httpx
+import src.utils.config as config
+from src.llm import client as llm_client
+from src.llm.client import LLMClient
+
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def stub_transport(seen):
+    """Local stand-in for the Groq API: echoes the last user message."""
+    def handler(request):
+        body = json.loads(request.content)
+        seen.append(body)
+        return httpx.Response(200, json=_completion("echo: " + body["messages"][-1]["content"]))
+    return httpx.MockTransport(handler)
+
+
+def test_generate_response_over_stub_transport(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    seen = []
+    client = LLMClient(model_name="test-model", transport=stub_transport(seen))
+
+    assert client.generate_response([{"role": "user", "content": "hi"}]) == "echo: hi"
+    assert seen[0]["model"] == "test-model" and seen[0]["max_tokens"] == 500
+    client.close()
+
+
+def test_agenerate_response_over_async_stub_transport(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    seen = []
+    client = LLMClient(model_name="test-model", async_transport=stub_transport(seen))
+
+    async def run():
+        replies = await asyncio.gather(*[
+            client.agenerate_response([{"role": "user", "content": f"q{i}"}]) for i in range(5)
+        ])
+        await client.aclose()
+        return replies
+
+    assert asyncio.run(run()) == [f"echo: q{i}" for i in range(5)]
+    assert len(seen) == 5
+
+
+def test_astream_response_yields_deltas(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        chunks = []
+        for piece in ["Take ", "a slow ", "breath."]:
+            chunk = {
+                "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "test-model",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            chunks.append(f"data: {json.dumps(chunk)}\n\n")
+        chunks.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content="".join(chunks))
+
+    client = LLMClient(model_name="test-model", async_transport=httpx.MockTransport(handler))
+
+    async def run():
+        tokens = [t async for t in client.astream_response([{"role": "user", "content": "hi"}])]
+        await client.aclose()
+        return tokens
+
+    assert asyncio.run(run()) == ["Take ", "a slow ", "breath."]
+
+
+def test_get_llm_client_is_shared_across_threads(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_client, "_shared_client", None)
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(llm_client.get_llm_client())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(c) for c in clients}) == 1
+    assert clients[0].http_client is clients[0].client._client
+    clients[0].close()
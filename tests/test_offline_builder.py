@@ -0,0 +1,68 @@
+import functools
+import os
+
+import numpy as np
+
+from benchmarks.retrieval import HashingEmbedder, write_corpus
+from src.rag.pre_index_documents_offline import build_vector_store, partition_files
+from src.storage.vector_store import InMemoryVectorStore
+
+_embedder = functools.partial(HashingEmbedder, dim=16)
+
+
+def test_partition_is_contiguous_and_balanced(tmp_path):
+    paths = []
+    for i, size in enumerate([10, 10, 10, 10, 40, 10, 10]):
+        path = tmp_path / f"{i}.txt"
+        path.write_text("x" * size)
+        paths.append(str(path))
+
+    shards = partition_files(paths, 3)
+
+    assert [p for shard in shards for p in shard] == paths
+    assert len(shards) == 3
+    assert partition_files(paths[:2], 5) == [[paths[0]], [paths[1]]]
+
+
+def test_sharded_build_matches_single_process(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    write_corpus(str(docs_dir), 1000)
+
+    single = build_vector_store(str(docs_dir), str(tmp_path / "single"), workers=1, embedder_factory=_embedder)
+    build_vector_store(str(docs_dir), str(tmp_path / "sharded"), workers=3, torch_threads=1, embedder_factory=_embedder)
+
+    sharded = InMemoryVectorStore()
+    assert sharded.load(str(tmp_path / "sharded"))
+    assert sharded.ids == single.ids
+    assert list(sharded.texts) == list(single.texts)
+    assert sharded.metadatas == single.metadatas
+    assert sharded.hashes == single.hashes
+    assert np.allclose(sharded.embeddings, single.embeddings, atol=1e-6)
+    assert not os.path.exists(str(tmp_path / "sharded") + ".shards")
+
+
+def test_thread_limits_reach_spawned_workers_and_are_restored(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    from src.rag.pre_index_documents_offline import _worker_env
+
+    monkeypatch.setenv("OMP_NUM_THREADS", "7")
+    monkeypatch.delenv("MKL_NUM_THREADS", raising=False)
+    with _worker_env(2), ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        assert pool.submit(os.getenv, "MKL_NUM_THREADS").result() == "2"
+
+    assert os.environ["OMP_NUM_THREADS"] == "7"
+    assert "MKL_NUM_THREADS" not in os.environ
+
+
+def test_sharded_build_of_an_empty_docs_dir_saves_an_empty_store(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+
+    store = build_vector_store(str(docs_dir), str(tmp_path / "out"), workers=4, embedder_factory=_embedder)
+
+    assert store.ids == []
+    loaded = InMemoryVectorStore()
+    assert loaded.load(str(tmp_path / "out"))
+    assert loaded.ids == []
@@ -0,0 +1,56 @@
+import src.utils.config as config
+from src.llm.prompts import build_messages
+from src.rag.indexer import section_metadata
+from src.utils.tokens import count_tokens
+
+
+def _doc(text, n_tokens=None):
+    metadata = {"topics": ["stress"]}
+    if n_tokens is not None:
+        metadata["n_tokens"] = n_tokens
+    return {"text": text, "metadata": metadata}
+
+
+def _total_tokens(messages):
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def test_everything_fits_within_budget():
+    docs = [_doc("Breathe slowly."), _doc("Sleep early.")]
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+    messages = build_messages("I feel stressed", docs, history, instruction="Be kind.", token_budget=3000)
+
+    assert messages[0] == {"role": "system", "content": "Be kind."}
+    assert messages[1:3] == history
+    assert "Breathe slowly.\n\nSleep early." in messages[-1]["content"]
+    assert "I feel stressed" in messages[-1]["content"]
+    assert "n_tokens" not in docs[0]["metadata"]  # counted locally, the store's metadata is left alone
+
+
+def test_lowest_ranked_context_is_truncated_then_dropped():
+    best, middle, worst = ("alpha " * 200).strip(), ("beta " * 400).strip(), ("gamma " * 400).strip()
+    docs = [_doc(best, count_tokens(best)), _doc(middle, count_tokens(middle)), _doc(worst, count_tokens(worst))]
+
+    messages = build_messages("q", docs, [], instruction="Be kind.", token_budget=700)
+    content = messages[-1]["content"]
+
+    assert best in content
+    assert "beta" in content and middle not in content  # truncated at a word boundary
+    assert "gamma" not in content
+    assert _total_tokens(messages) <= 700
+
+
+def test_history_keeps_newest_messages(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_HISTORY_TOKENS", 120)
+    history = [{"role": "user", "content": f"message {i} " + "x" * 200} for i in range(5)]
+
+    messages = build_messages("q", [], history, instruction="Be kind.", token_budget=3000)
+
+    assert messages[1:-1] == history[-2:]
+
+
+def test_indexer_metadata_carries_token_count():
+    doc = {"text": "Breathe slowly.", "metadata": {"topics": ["stress"]}}
+    assert section_metadata(doc) == {"topics": ["stress"], "n_tokens": count_tokens("Breathe slowly.")}
+    assert "n_tokens" not in doc["metadata"]
@@ -1,30 +1,67 @@
+import os
+import tempfile
 import unittest
-from src.rag.retriever import Retriever
+
+import numpy as np
+
+from benchmarks import retrieval as bench
+from src.rag.doc_loader import load_text_documents
 from src.rag.indexer import Indexer
-from src.rag.embeddings import Embeddings
+from src.rag.retriever import Retriever
+from src.storage.vector_store import InMemoryVectorStore
+
 
 class TestRAGComponents(unittest.TestCase):
 
     def setUp(self):
-        self.retriever = Retriever()
-        self.indexer = Indexer()
-        self.embeddings = Embeddings()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embedder = bench.HashingEmbedder(dim=32)
+        self.store = InMemoryVectorStore()
+        self.indexer = Indexer(self.embedder, self.store)
+        self.retriever = Retriever(self.embedder, self.store)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _index_corpus(self, n_sections):
+        doc_dir = os.path.join(self.tmp.name, "docs")
+        os.makedirs(doc_dir)
+        bench.write_corpus(doc_dir, n_sections)
+        docs = load_text_documents(doc_dir)
+        self.store.add_many(
+            [d["id"] for d in docs], [d["text"] for d in docs],
+            self.embedder.embed([d["text"] for d in docs]), [d["metadata"] for d in docs],
+        )
+        return docs
 
     def test_retrieve_documents(self):
-        query = "example query"
-        documents = self.retriever.retrieve_documents(query)
+        docs = self._index_corpus(50)
+        query = bench.make_queries(docs, 1)[0]
+        documents = self.retriever.retrieve(query)
         self.assertIsInstance(documents, list)
+        self.assertTrue(0 < len(documents) <= 3)
+        topic = query.split()[0]
+        for doc in documents:
+            self.assertTrue(any(topic in t.split() for t in doc["metadata"]["topics"]))
 
     def test_index_documents(self):
-        documents = ["doc1", "doc2"]
+        path = os.path.join(self.tmp.name, "store")
+        documents = [{"id": "doc1", "text": "breathe slowly"}, {"id": "doc2", "text": "sleep early"}]
+        self.store.save = lambda: InMemoryVectorStore.save(self.store, path)
         self.indexer.index_documents(documents)
-        # Assuming we have a way to verify indexing
-        self.assertTrue(True)  # Replace with actual verification
+        self.assertEqual(self.store.ids, ["doc1", "doc2"])
+        self.assertTrue(InMemoryVectorStore().load(path))
 
     def test_generate_embeddings(self):
-        text = "sample text"
-        vector = self.embeddings.generate_embeddings(text)
-        self.assertIsInstance(vector, list)  # Assuming embeddings are returned as a list
+        vector = self.embedder.embed_query("sample text")
+        self.assertEqual(vector.shape, (32,))
+        np.testing.assert_array_equal(vector, bench.HashingEmbedder(dim=32).embed_query("sample text"))
+
+    def test_benchmark_exact_targets_have_full_recall(self):
+        results = bench.run([300], ["store", "topic"], n_queries=20, dim=32)
+        self.assertEqual([r["recall@3"] for r in results], [1.0, 1.0])
+        self.assertTrue(all(r["p99_ms"] >= r["p50_ms"] for r in results))
+
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,38 @@
+import time
+import numpy as np
+from src.llm.response_cache import SemanticResponseCache
+
+
+def test_similar_query_with_same_docs_hits():
+    cache = SemanticResponseCache(threshold=0.95, ttl=60, max_entries=8)
+    cache.store(np.array([1.0, 0.0]), ["a", "b"], "breathe slowly")
+
+    assert cache.lookup(np.array([0.99, 0.05]), ["a", "b"]) == "breathe slowly"
+    assert cache.lookup(np.array([0.5, 0.5]), ["a", "b"]) is None  # too dissimilar
+    assert cache.lookup(np.array([1.0, 0.0]), ["a", "c"]) is None  # different context
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["entries"][0]["hits"] == 1
+
+
+def test_ttl_expiry():
+    cache = SemanticResponseCache(threshold=0.9, ttl=0.01, max_entries=8)
+    cache.store(np.array([1.0, 0.0]), ["a"], "old")
+    time.sleep(0.02)
+
+    assert cache.lookup(np.array([1.0, 0.0]), ["a"]) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction():
+    cache = SemanticResponseCache(threshold=0.9, ttl=60, max_entries=2)
+    cache.store(np.array([1.0, 0.0]), ["a"], "first")
+    cache.store(np.array([0.0, 1.0]), ["b"], "second")
+    assert cache.lookup(np.array([1.0, 0.0]), ["a"]) == "first"  # "second" is now least recent
+    cache.store(np.array([1.0, 1.0]), ["c"], "third")
+
+    assert cache.lookup(np.array([0.0, 1.0]), ["b"]) is None
+    assert cache.lookup(np.array([1.0, 0.0]), ["a"]) == "first"
+    assert cache.stats()["size"] == 2
+
@@ -0,0 +1,56 @@
+import asyncio
+import src.utils.config as config
+from src.utils import security
+
+
+def test_password_hashing_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(config, "BCRYPT_ROUNDS", 4)
+
+    async def run():
+        hashed = await security.ahash_password("secret")
+        return hashed, await security.averify_password("secret", hashed), await security.averify_password("nope", hashed)
+
+    hashed, ok, bad = asyncio.run(run())
+    assert hashed.startswith("$2b$04$")
+    assert ok and not bad
+
+
+def test_session_tokens(monkeypatch):
+    monkeypatch.setattr(config, "SESSION_SECRET", "test-secret")
+    token = security.create_session_token("a@example.com")
+    assert security.verify_session_token(token) == "a@example.com"
+
+    payload, signature = token.split(".")
+    forged = security._b64encode(b'{"sub": "b@example.com", "exp": 9999999999}')
+    assert security.verify_session_token(f"{forged}.{signature}") is None
+    assert security.verify_session_token("garbage") is None
+    assert security.verify_session_token(security.create_session_token("a@example.com", ttl=-1)) is None
+
+    monkeypatch.setattr(config, "SESSION_SECRET", "rotated")
+    assert security.verify_session_token(token) is None
+
+
+def test_zero_ttl_is_not_the_default(monkeypatch):
+    monkeypatch.setattr(config, "SESSION_SECRET", "test-secret")
+    monkeypatch.setattr(security.time, "time", lambda: 1000.0)
+    payload = security.create_session_token("a@example.com", ttl=0).split(".")[0]
+    assert security.json.loads(security._b64decode(payload))["exp"] == 1000
+
+
+def test_generated_session_secret_is_persisted_and_shared(tmp_path):
+    path = str(tmp_path / "secrets" / ".session_secret")
+    first = security._load_or_create_secret(path)
+    assert len(first) == 64
+    assert security._load_or_create_secret(path) == first  # another worker / a restart
+    assert list((tmp_path / "secrets").iterdir()) == [tmp_path / "secrets" / ".session_secret"]
+
+
+def test_secret_file_is_only_created_when_a_token_is_signed(tmp_path, monkeypatch):
+    path = tmp_path / ".session_secret"
+    monkeypatch.setattr(config, "SESSION_SECRET", None)
+    monkeypatch.setattr(config, "SESSION_SECRET_PATH", str(path))
+    assert not path.exists()
+
+    token = security.create_session_token("a@example.com")
+    assert path.exists()
+    assert security.verify_session_token(token) == "a@example.com"
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+import src.utils.config as config
+from src.rag.indexer import Indexer
+from src.rag.retriever import HybridRetriever, Retriever
+from src.storage.sharded_vector_store import ShardedVectorStore
+from src.storage.vector_store import InMemoryVectorStore
+
+TOPICS = ["stress", "sleep", "anger", "grief", "exam pressure", "loneliness"]
+
+
+def _fill(*stores, n=300, dim=16):
+    rng = np.random.default_rng(0)
+    ids = [f"d{i}" for i in range(n)]
+    texts = [f"text {i}" for i in range(n)]
+    metadatas = [{"topics": [TOPICS[i % len(TOPICS)]]} for i in range(n)]
+    embeddings = rng.standard_normal((n, dim)).astype("float32")
+    for store in stores:
+        store.add_many(ids, texts, embeddings, metadatas, [f"h{i}" for i in range(n)])
+    return embeddings
+
+
+@pytest.mark.parametrize("partition", ["topic", "hash"])
+def test_matches_monolithic_store(partition):
+    flat, sharded = InMemoryVectorStore(), ShardedVectorStore(n_shards=4, partition=partition, search_threads=4)
+    embeddings = _fill(flat, sharded)
+    q = embeddings[7] + 0.1
+
+    for query in ["i feel stress", "sleep and grief", "nothing relevant"]:
+        expected = flat.query(q, top_k=5, mask=flat.topic_mask(query))
+        mask = sharded.topic_mask(query)
+        assert sorted(np.asarray(sharded.ids)[mask]) == sorted(np.asarray(flat.ids)[flat.topic_mask(query)])
+        got = sharded.query(q, top_k=5, mask=mask)
+        assert [r["id"] for r in got] == [r["id"] for r in expected]
+        assert np.allclose([r["score"] for r in got], [r["score"] for r in expected], atol=1e-6)
+
+    assert [r["id"] for r in sharded.query(q, top_k=10)] == [r["id"] for r in flat.query(q, top_k=10)]
+
+
+def test_topic_routing_skips_shards(monkeypatch):
+    sharded = ShardedVectorStore(n_shards=4, partition="topic")
+    embeddings = _fill(sharded)
+    calls = []
+    for shard in sharded.shards:
+        original = shard.query
+        monkeypatch.setattr(shard, "query", lambda *a, _orig=original, **kw: calls.append(1) or _orig(*a, **kw))
+
+    results = sharded.query(embeddings[0], top_k=3, mask=sharded.topic_mask("sleep"))
+
+    assert len(calls) == 1
+    assert all(r["metadata"]["topics"] == ["sleep"] for r in results)
+
+
+def test_global_rows_get_and_distances():
+    sharded = ShardedVectorStore(n_shards=3, partition="hash")
+    embeddings = _fill(sharded, n=50)
+
+    rows = [0, 17, 49]
+    for row in rows:
+        doc_id = sharded.ids[row]
+        assert sharded.texts[row] == f"text {doc_id[1:]}"
+        assert sharded.get(doc_id)["metadata"] is sharded.metadatas[row]
+    q = embeddings[3]
+    expected = [1.0 - embeddings[int(sharded.ids[r][1:])] @ q / np.linalg.norm(embeddings[int(sharded.ids[r][1:])]) / np.linalg.norm(q) for r in rows]
+    assert np.allclose(sharded.distances(q, rows), expected, atol=1e-5)
+    assert sharded.get("missing") is None
+
+
+def test_save_load_and_repartition(tmp_path):
+    sharded = ShardedVectorStore(n_shards=3, partition="topic")
+    _fill(sharded, n=40)
+    sharded.save(str(tmp_path / "sharded"))
+
+    same = ShardedVectorStore(n_shards=3, partition="topic")
+    assert same.load(str(tmp_path / "sharded"))
+    assert same.ids == sharded.ids
+
+    resharded = ShardedVectorStore(n_shards=2, partition="hash")
+    assert resharded.load(str(tmp_path / "sharded"))
+    assert sorted(resharded.ids) == sorted(sharded.ids)
+
+    flat = InMemoryVectorStore()
+    _fill(flat, n=40)
+    flat.save(str(tmp_path / "flat"))
+    from_flat = ShardedVectorStore(n_shards=3, partition="topic")
+    assert from_flat.load(str(tmp_path / "flat"))
+    assert sorted(from_flat.ids) == sorted(flat.ids)
+
+
+def test_concurrent_saves_keep_a_complete_store_on_disk(tmp_path):
+    import os
+    import threading
+    sharded = ShardedVectorStore(n_shards=3, partition="topic")
+    _fill(sharded, n=40)
+    path = str(tmp_path / "sharded")
+    errors = []
+
+    def saver():
+        for _ in range(5):
+            try:
+                sharded.save(path)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=saver) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ["sharded", "sharded.lock"]
+    loaded = ShardedVectorStore(n_shards=3, partition="topic")
+    assert loaded.load(path) and loaded.ids == sharded.ids
+
+
+class _Embedder:
+    def embed(self, texts, batch_size=None):
+        return np.array([[len(t), t.count("e") + 1.0] for t in texts], dtype="float32")
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+def test_works_with_indexer_and_retrievers(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SHARDED_VECTOR_STORE_PATH", str(tmp_path / "sharded"))
+    store = ShardedVectorStore(n_shards=3, partition="topic")
+    docs = [
+        {"id": f"{topic}-{i}", "text": f"{topic} tip {i}", "metadata": {"topics": [topic]}}
+        for topic in TOPICS for i in range(3)
+    ]
+
+    assert Indexer(_Embedder(), store).sync(docs)["added"] == len(docs)
+    assert Indexer(_Embedder(), store).sync(docs[1:])["removed"] == 1
+
+    results = Retriever(_Embedder(), store).retrieve("help with anger", top_k=2)
+    assert [r["metadata"]["topics"] for r in results] == [["anger"], ["anger"]]
+
+    hybrid = HybridRetriever(_Embedder(), store, index_path=str(tmp_path / "bm25"))
+    assert hybrid.bm25().n_docs == len(store.ids)
+    results = hybrid.retrieve("grief tip 2", top_k=3)
+    assert "grief-2" in [r["id"] for r in results]
+    assert all(r["text"] == store.get(r["id"])["text"] for r in results)
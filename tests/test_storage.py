@@ -1,4 +1,5 @@
 import numpy as np
+import src.utils.config as config
 from src.storage.vector_store import InMemoryVectorStore
 
 def test_add_and_query():
@@ -10,4 +11,195 @@ def test_add_and_query():
     q = np.array([0.95, 0.05, 0.0])
     res = vs.query(q, top_k=2)
     assert len(res) == 2
-    assert res[0]["id"] in {"a","b"}
\ No newline at end of file
+    assert res[0]["id"] in {"a","b"}
+
+def test_query_with_mask_only_returns_masked_rows():
+    vs = InMemoryVectorStore()
+    vs.add("a", "text a", np.array([1.0, 0.0, 0.0]))
+    vs.add("b", "text b", np.array([0.0, 1.0, 0.0]))
+    vs.add("c", "text c", np.array([0.0, 5.0, 0.1]))
+    q = np.array([0.0, 0.0, 1.0])
+    res = vs.query(q, top_k=3, mask=np.array([False, True, True]))
+    assert [r["id"] for r in res] == ["c", "b"]
+    assert np.allclose(np.linalg.norm(vs.embeddings, axis=1), 1.0)
+    assert abs(res[0]["score"] - (1.0 - 0.1 / np.sqrt(25.01))) < 1e-5
+
+
+def _legacy_topic_rows(metadatas, query):
+    # Reference: the per-query loop the inverted index replaced
+    query_lower = query.lower()
+    query_words = set(query_lower.split())
+    rows = []
+    for i, metadata in enumerate(metadatas):
+        for topic in metadata.get("topics", []):
+            topic_lower = topic.lower()
+            if topic_lower in query_lower or set(topic_lower.split()) & query_words:
+                rows.append(i)
+                break
+    return rows
+
+
+def test_topic_mask_matches_legacy_loop():
+    rng = np.random.default_rng(0)
+    vocab = ["love", "stress", "exam", "anxiety", "sleep", "anx", "Panic", "work life", "self esteem", "grief"]
+    vs = InMemoryVectorStore()
+    for i in range(200):
+        topics = list(rng.choice(vocab, size=rng.integers(0, 4), replace=False))
+        if rng.random() < 0.3:
+            topics.append(" ".join(rng.choice(vocab, size=2)))
+        vs.add(f"d{i}", f"text {i}", rng.normal(size=4), {"topics": topics})
+
+    queries = [
+        "love stress", "I have exam STRESS", "anxiety and panic", "stressed out",
+        "how do i balance work and life", "self esteem issues", "hello", "", "sleepless",
+    ]
+    for query in queries:
+        assert np.flatnonzero(vs.topic_mask(query)).tolist() == _legacy_topic_rows(vs.metadatas, query)
+
+
+def test_add_many_appends_into_growing_buffer():
+    vs = InMemoryVectorStore()
+    vs.add("a", "text a", np.array([3.0, 4.0]), {"topics": ["sleep"]})
+    vs.add_many(["b", "c"], ["text b", "text c"], np.array([[0.0, 2.0], [1.0, 0.0]]),
+                [{"topics": ["stress"]}, None])
+    assert vs.ids == ["a", "b", "c"]
+    assert vs.embeddings.shape == (3, 2)
+    assert np.allclose(vs.embeddings[0], [0.6, 0.8])
+    assert vs.metadatas[2] == {}
+    assert np.flatnonzero(vs.topic_mask("stress")).tolist() == [1]
+
+
+def _small_store():
+    vs = InMemoryVectorStore()
+    vs.add_many(
+        ["a", "b", "c"],
+        ["text a", "tëxt b", ""],
+        np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.5, 0.5, 0.0]]),
+        [{"topics": ["sleep"]}, {"topics": ["stress"], "source": "b.txt"}, {}],
+        ["h1", None, "h3"],
+    )
+    return vs
+
+
+def test_save_and_load_memory_mapped_format(tmp_path):
+    path = str(tmp_path / "store")
+    _small_store().save(path)
+
+    vs = InMemoryVectorStore()
+    assert vs.load(path)
+    assert isinstance(vs.embeddings, np.memmap)
+    assert vs.ids == ["a", "b", "c"]
+    assert list(vs.texts) == ["text a", "tëxt b", ""]
+    assert vs.hashes == ["h1", None, "h3"]
+    assert vs.metadatas[1]["source"] == "b.txt"
+    assert [r["id"] for r in vs.query(np.array([0.0, 1.0, 0.0]), top_k=1)] == ["b"]
+
+    # Mutating a loaded store copies out of the read-only map
+    vs.add("d", "text d", np.array([0.0, 0.0, 1.0]), {"topics": ["sleep"]})
+    vs.remove(["a"])
+    assert vs.ids == ["b", "c", "d"]
+    assert np.flatnonzero(vs.topic_mask("sleep")).tolist() == [2]
+
+
+def test_float16_store_and_legacy_npz_autodetect(tmp_path):
+    _small_store().save(str(tmp_path / "store16"), dtype="float16")
+    vs16 = InMemoryVectorStore()
+    vs16.load(str(tmp_path / "store16"))
+    assert vs16.embeddings.dtype == np.float16
+    assert [r["id"] for r in vs16.query(np.array([1.0, 0.1, 0.0]), top_k=2)] == ["a", "c"]
+
+    _small_store().save(str(tmp_path / "legacy.npz"))
+    legacy = InMemoryVectorStore()
+    assert legacy.load(str(tmp_path / "legacy.npz"))
+    assert legacy.ids == ["a", "b", "c"] and legacy.hashes == ["h1", None, "h3"]
+    assert not InMemoryVectorStore().load(str(tmp_path / "missing"))
+
+
+def test_quantized_stores_rerank_to_exact_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_STORE_SPILL_DIR", str(tmp_path))
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(500, 32)).astype("float32")
+    mask = rng.random(500) < 0.5
+    exact = InMemoryVectorStore()
+    exact.add_many([str(i) for i in range(500)], [""] * 500, embeddings)
+
+    for quantization in ("float16", "int8"):
+        vs = InMemoryVectorStore(quantization=quantization, rerank_factor=4)
+        vs.add_many([str(i) for i in range(500)], [""] * 500, embeddings)
+        assert vs._compact is None
+        for _ in range(10):
+            q = rng.normal(size=32)
+            expected = exact.query(q, top_k=5, mask=mask)
+            got = vs.query(q, top_k=5, mask=mask)
+            assert [r["id"] for r in got] == [r["id"] for r in expected]
+            assert np.allclose([r["score"] for r in got], [r["score"] for r in expected], atol=1e-5)
+        assert vs._compact[0].dtype == np.dtype(quantization)
+        # Only the codes stay resident: full-precision rows were spilled to a memory map
+        assert isinstance(vs.embeddings, np.memmap)
+
+        # Appending after the spill still works and re-quantizes
+        vs.add_many(["new"], [""], embeddings[:1] * -1)
+        assert vs._compact is None
+        assert vs.query(-embeddings[0], top_k=1)[0]["id"] == "new"
+
+
+def test_concurrent_saves_to_one_path_do_not_clobber_each_other(tmp_path):
+    import os
+    import threading
+    path = str(tmp_path / "store")
+    errors = []
+
+    def saver():
+        store = _small_store()
+        for _ in range(10):
+            try:
+                store.save(path)
+            except Exception as e:  # pragma: no cover - the failure being tested
+                errors.append(e)
+
+    threads = [threading.Thread(target=saver) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    vs = InMemoryVectorStore()
+    assert vs.load(path) and vs.ids == ["a", "b", "c"]
+    assert sorted(os.listdir(tmp_path)) == ["store", "store.lock"]  # no temp or old dirs left behind
+
+
+def test_file_lock_lets_one_holder_in():
+    import tempfile
+    from src.utils.fs import file_lock
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path = f"{tmp}/sync.lock"
+        with file_lock(lock_path, blocking=False) as leader:
+            assert leader
+            with file_lock(lock_path, blocking=False) as other:
+                assert not other  # another worker: waits, then only loads
+        with file_lock(lock_path, blocking=False) as again:
+            assert again
+
+
+def test_spill_file_goes_to_the_spill_dir_and_close_removes_it(tmp_path, monkeypatch):
+    import os
+    monkeypatch.setattr(config, "VECTOR_STORE_SPILL_DIR", str(tmp_path))
+    real_remove = os.remove
+    calls = []
+
+    def remove_failing_once(path):
+        calls.append(path)
+        if len(calls) == 1:
+            raise PermissionError("file is mapped")  # as on platforms that cannot unlink open files
+        real_remove(path)
+
+    monkeypatch.setattr(os, "remove", remove_failing_once)
+    vs = InMemoryVectorStore(quantization="int8")
+    vs.add_many(["a", "b"], ["", ""], np.eye(2, 4, dtype="float32"))
+    vs.query(np.ones(4), top_k=1)
+
+    spilled = [name for name in os.listdir(tmp_path) if name.endswith(".spill")]
+    assert len(spilled) == 1
+    vs.close()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,176 @@
+import threading
+from src.storage import user_db
+
+
+def _use_tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_db, "DB_PATH", str(tmp_path / "users.db"))
+    user_db.init_db()
+
+
+def test_wal_mode_and_concurrent_usage_increments(tmp_path, monkeypatch):
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+    assert user_db._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def worker():
+        for _ in range(25):
+            user_db.increment_usage("a@example.com")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert user_db.get_usage("a@example.com") == 200
+    assert user_db.get_user("a@example.com")[4] == 200
+    user_db.close_connections()
+
+
+def test_messages_round_trip_after_reconnect(tmp_path, monkeypatch):
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.save_message("a@example.com", "user", "hi")
+    user_db.save_message("a@example.com", "assistant", "hello")
+    user_db.save_message("b@example.com", "user", "other")
+    user_db.close_connections()
+
+    rows = user_db.get_messages("a@example.com", limit=10)
+    assert [(r[0], r[1]) for r in rows] == [("user", "hi"), ("assistant", "hello")]
+    user_db.close_connections()
+
+
+def test_init_db_migrates_existing_database(tmp_path, monkeypatch):
+    import sqlite3
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT, role TEXT, "
+                 "content TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO messages (email, role, content) VALUES ('a@example.com', 'user', 'hi')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(user_db, "DB_PATH", str(path))
+    user_db.init_db()
+    user_db.init_db()  # idempotent
+
+    assert user_db.schema_version() == len(user_db._MIGRATIONS)
+    plan = user_db._connect().execute(
+        "EXPLAIN QUERY PLAN SELECT role, content, timestamp FROM messages WHERE email = ? ORDER BY id DESC LIMIT ?",
+        ("a@example.com", 5),
+    ).fetchall()
+    assert "idx_messages_email_id" in " ".join(str(row[-1]) for row in plan)
+    assert user_db.get_messages("a@example.com")[0][1] == "hi"
+    user_db.close_connections()
+
+
+def test_write_behind_coalesces_and_reads_own_writes(tmp_path, monkeypatch):
+    from src.storage.write_behind import WriteBehindWriter
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+
+    writer = WriteBehindWriter(flush_interval_ms=60_000, max_pending=10_000)
+    for _ in range(5):
+        writer.increment_usage("a@example.com")
+    writer.save_message("a@example.com", "user", "hi")
+
+    assert user_db.get_usage("a@example.com") == 0
+    assert writer.get_usage("a@example.com") == 5
+    assert writer.get_usage("nobody@example.com") is None
+
+    writer.close()  # flush-on-shutdown
+    assert writer.flushes == 1
+    assert user_db.get_usage("a@example.com") == 5
+    assert writer.get_usage("a@example.com") == 5
+    assert user_db.get_messages("a@example.com")[0][1] == "hi"
+    user_db.close_connections()
+
+
+def test_write_behind_flushes_when_batch_is_full(tmp_path, monkeypatch):
+    import time
+    from src.storage.write_behind import WriteBehindWriter
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+
+    writer = WriteBehindWriter(flush_interval_ms=60_000, max_pending=3)
+    for _ in range(3):
+        writer.increment_usage("a@example.com")
+    deadline = time.time() + 5
+    while writer.flushes == 0 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert user_db.get_usage("a@example.com") == 3
+    writer.close()
+    user_db.close_connections()
+
+
+def test_connections_are_closed_when_their_thread_exits(tmp_path, monkeypatch):
+    import gc
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+    before = len(user_db._all_connections)
+
+    def worker():
+        user_db.get_usage("a@example.com")
+
+    for _ in range(20):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+    gc.collect()
+
+    assert len(user_db._all_connections) == before
+    user_db.close_connections()
+
+
+def test_write_behind_usage_counts_a_flush_landing_mid_read_once(tmp_path, monkeypatch):
+    from src.storage.write_behind import WriteBehindWriter
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+    writer = WriteBehindWriter(flush_interval_ms=60_000, max_pending=10_000)
+    writer.increment_usage("a@example.com", 4)
+
+    real_get_user = user_db.get_user
+    calls = []
+
+    def get_user_racing_a_flush(email):
+        calls.append(email)
+        if len(calls) == 1:
+            writer.flush()  # the batch commits between the snapshot and the SELECT
+        return real_get_user(email)
+
+    monkeypatch.setattr(user_db, "get_user", get_user_racing_a_flush)
+    assert writer.get_usage("a@example.com") == 4
+    assert len(calls) == 2  # re-read after the generation changed
+    writer.close()
+    user_db.close_connections()
+
+
+def test_write_behind_drops_a_row_that_always_fails(tmp_path, monkeypatch):
+    from src.storage.write_behind import WriteBehindWriter
+    _use_tmp_db(tmp_path, monkeypatch)
+    user_db.create_user("a@example.com", 30, "f", "secret")
+    real_apply = user_db.apply_writes
+
+    def apply_rejecting_bad_rows(usage, messages):
+        if any(content == "bad" for _, _, content in messages):
+            raise ValueError("bad row")
+        real_apply(usage, messages)
+
+    monkeypatch.setattr(user_db, "apply_writes", apply_rejecting_bad_rows)
+    writer = WriteBehindWriter(flush_interval_ms=60_000, max_pending=10_000, max_retries=2)
+    writer.save_message("a@example.com", "user", "bad")
+    writer.increment_usage("a@example.com")
+    writer.flush()
+    writer.flush()
+    writer.save_message("a@example.com", "user", "good")
+    assert user_db.get_messages("a@example.com") == []  # still retrying the whole batch
+
+    writer.flush()  # third failure: written row by row
+    assert writer.dropped == 1
+    assert [m[1] for m in user_db.get_messages("a@example.com")] == ["good"]
+    assert user_db.get_usage("a@example.com") == 1
+
+    writer.save_message("a@example.com", "assistant", "later")
+    writer.close()
+    assert [m[1] for m in user_db.get_messages("a@example.com")] == ["good", "later"]
+    user_db.close_connections()